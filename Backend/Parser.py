@@ -1,13 +1,20 @@
 import os
-import re
-import uuid
-import uvicorn
-from datetime import datetime
-from fastapi import FastAPI, UploadFile, File, Form, APIRouter
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from fastapi import FastAPI, UploadFile, File, Form, APIRouter, Request
 from fastapi.middleware.cors import CORSMiddleware
-from supabase import create_client
 from dotenv import load_dotenv
-import pdfplumber
+from cache import LRUCache
+from repository import get_repository
+from jobs import QueueFullError, job_queue, queue_full_response, queued_response, router as jobs_router
+from admission import UploadAdmissionMiddleware
+from metrics import counter, errors_total, span
+from dedupe import content_hash, filter_new_transactions
+from tokenizer import tokenize_statement
+from merchants import with_merchants
+from tabular import detect_format, parse_tabular
+from pdf_text import extract_leading_pages, extract_page_range
 
 # Load environment variables
 load_dotenv()
@@ -15,7 +22,11 @@ load_dotenv()
 # 1. Initialize FastAPI app (Standalone)
 app = FastAPI(title="Finance Parser Service")
 
-# 2. Add CORS so your React frontend can talk to it directly
+# 2. Admission control for /upload (size cap while streaming, bounded parse concurrency),
+# added before CORS so its 413/429 responses still carry the CORS headers
+app.add_middleware(UploadAdmissionMiddleware)
+
+# Add CORS so your React frontend can talk to it directly
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"], # In production, replace with your Vercel URL
@@ -24,147 +35,236 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# 3. Initialize Supabase client
+# 3. Database access goes through the shared, pooled repository (repository.py)
 # Ensure these variables are set in your Railway 'Variables' tab
-supabase = create_client(
-    os.getenv("VITE_SUPABASE_URL"), 
-    os.getenv("SUPABASE_SERVICE_ROLE_KEY")
-)
 
 # 4. Define an APIRouter (Optional but good for modularity)
 router = APIRouter()
 
-def clean_amount(amount_str: str) -> float:
-    """ Converts amount string like 'Rs. 1,234.56' or '+Rs. 500' to float. """
-    cleaned = re.sub(r'[Rs\.,\s₹+]', '', amount_str)
-    try:
-        return float(cleaned)
-    except ValueError:
-        return 0.0
-
-def extract_category_dynamic(block_text: str) -> str:
-    """ Dynamically extracts category by looking for the hashtag symbol. """
-    tag_match = re.search(r'#\s*([A-Za-z]+(?:\s+[A-Za-z]+)*)', block_text)
-    
-    if tag_match:
-        category = tag_match.group(1).strip()
-        category = ' '.join(word.capitalize() for word in category.split())
-        
-        tag_map = {
-            "Medical": "Healthcare",
-            "Transfers": "Money Transfer",
-            "Money Transfer": "Money Transfer",
-            "Money Received": "Money Received"
+# 5. Process pool for CPU-bound PDF text extraction (keeps the event loop free)
+# PARSER_WORKERS sizes the pool, PARSER_PAGES_PER_CHUNK sets the page range per task.
+# Only PDFs of at least PARSER_SPLIT_BYTES are split into ranges; smaller ones are one task.
+# Workers are started with PARSER_START_METHOD (forkserver where available, else spawn), never
+# forked from this process, whose event loop, thread pools and HTTP clients are already live
+PARSER_WORKERS = int(os.getenv("PARSER_WORKERS", os.cpu_count() or 1))
+PARSER_PAGES_PER_CHUNK = int(os.getenv("PARSER_PAGES_PER_CHUNK", 8))
+PARSER_SPLIT_BYTES = int(os.getenv("PARSER_SPLIT_BYTES", 1024 * 1024))
+PARSER_START_METHOD = os.getenv(
+    "PARSER_START_METHOD",
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+)
+extract_pool = None
+
+def get_extract_pool() -> ProcessPoolExecutor:
+    """ Lazily creates the extraction pool so importing the module stays cheap. """
+    global extract_pool
+    if extract_pool is None:
+        extract_pool = ProcessPoolExecutor(
+            max_workers=max(PARSER_WORKERS, 1), mp_context=multiprocessing.get_context(PARSER_START_METHOD)
+        )
+    return extract_pool
+
+def shutdown_extract_pool():
+    global extract_pool
+    if extract_pool is not None:
+        extract_pool.shutdown(wait=False, cancel_futures=True)
+        extract_pool = None
+
+router.add_event_handler("shutdown", shutdown_extract_pool)
+
+# 6. Content-addressed ingestion caches
+# parsed_statements: statement hash -> (parsed rows, rows dropped), so a re-upload skips pdfplumber and the regex pass
+# ingested_statements: (user_id, statement hash) -> rows written, so a repeat upload is a no-op.
+# Its entries expire after INGEST_CACHE_TTL_SECONDS: it catches double submits and retries, and a
+# later re-upload (e.g. after the user's rows were deleted) goes through the stored-row dedupe again
+INGEST_CACHE_SIZE = int(os.getenv("INGEST_CACHE_SIZE", 64))
+INGEST_CACHE_TTL_SECONDS = float(os.getenv("INGEST_CACHE_TTL_SECONDS", 300))
+parsed_statements = LRUCache(maxsize=INGEST_CACHE_SIZE)
+ingested_statements = LRUCache(maxsize=INGEST_CACHE_SIZE * 16, ttl=INGEST_CACHE_TTL_SECONDS)
+
+# 7. Ingest counters; stage timings are spans (see metrics.py)
+statements_total = counter("statements_total", "Statements parsed, by format.", ("format",))
+rows_parsed_total = counter("rows_parsed_total", "Transaction rows parsed from statements, by format.", ("format",))
+rows_dropped_total = counter("rows_dropped_total", "Statement rows skipped as unreadable, by format.", ("format",))
+rows_written_total = counter("rows_written_total", "New transaction rows stored.")
+ingest_cache_hits_total = counter("ingest_cache_hits_total", "Uploads answered from an ingest cache.", ("cache",))
+
+async def extract_page_texts(pdf_bytes: bytes) -> list:
+    """
+    Extracts page texts off the event loop. The first task also returns the
+    page count, so the document is not opened once more just to count pages.
+    Large documents have their remaining pages split into ranges that run in
+    parallel and are merged back in page order.
+    """
+    loop = asyncio.get_running_loop()
+    pool = get_extract_pool()
+
+    if len(pdf_bytes) < PARSER_SPLIT_BYTES:
+        _, page_texts = await loop.run_in_executor(pool, extract_leading_pages, pdf_bytes)
+        return page_texts
+
+    chunk = max(PARSER_PAGES_PER_CHUNK, 1)
+    page_count, page_texts = await loop.run_in_executor(pool, extract_leading_pages, pdf_bytes, chunk)
+    futures = [
+        loop.run_in_executor(pool, extract_page_range, pdf_bytes, start, min(start + chunk, page_count))
+        for start in range(chunk, page_count, chunk)
+    ]
+    for range_texts in await asyncio.gather(*futures):
+        page_texts.extend(range_texts)
+    return page_texts
+
+async def parse_statement(contents: bytes, user_id: str, filename: str = None) -> tuple:
+    """
+    (transaction rows, rows dropped) of a statement, off the event loop. PDFs go through text
+    extraction and the tokenizer; CSV/XLSX exports take the columnar path in tabular.py,
+    which also counts the rows it could not read (the tokenizer only yields rows it recognised).
+    """
+    kind = detect_format(contents, filename)
+    if kind == "pdf":
+        # Text extraction runs in the process pool; blocks and rows are built page by page
+        with span("upload.extract"):
+            page_texts = await extract_page_texts(contents)
+        with span("upload.tokenize"):
+            rows = list(tokenize_statement(page_texts, user_id))
+        dropped = 0
+    else:
+        loop = asyncio.get_running_loop()
+        with span("upload.tabular"):
+            rows, dropped = await loop.run_in_executor(get_extract_pool(), parse_tabular, contents, kind, user_id)
+        if dropped:
+            print(f"Skipped {dropped} unreadable rows in {filename or kind} for {user_id}")
+    statements_total.inc(format=kind)
+    rows_parsed_total.inc(len(rows), format=kind)
+    rows_dropped_total.inc(dropped, format=kind)
+    return rows, dropped
+
+async def ingest_statement(contents: bytes, user_id: str, filename: str = None) -> dict:
+    """ Parses a PDF, CSV or XLSX statement and stores its new transactions; returns the upload response. """
+    statement_hash = content_hash(contents)
+
+    if ingested_statements.get((user_id, statement_hash)) is not None:
+        ingest_cache_hits_total.inc(cache="ingested")
+        return {
+            "status": "success",
+            "count": 0,
+            "message": "Statement already imported, no new transactions"
+        }
+
+    cached = parsed_statements.get(statement_hash)
+    if cached is None:
+        # Merchant ids are resolved once here, so insights group by id instead of re-reading descriptions
+        rows, dropped = await parse_statement(contents, user_id, filename)
+        with span("upload.merchants"):
+            parsed = list(with_merchants(rows))
+        parsed_statements.put(statement_hash, (parsed, dropped))
+    else:
+        parsed, dropped = cached
+        ingest_cache_hits_total.inc(cache="parsed")
+
+    transactions = [{**tx, "user_id": user_id} for tx in parsed]
+    repo = get_repository()
+
+    if transactions:
+        # Only write rows whose (user_id, date, description, amount) fingerprint is new
+        with span("upload.dedupe"):
+            new_transactions = filter_new_transactions(
+                transactions, await repo.existing_transactions(user_id, transactions)
+            )
+        with span("upload.insert"):
+            result = await repo.insert_transactions(new_transactions)
+        rows_written_total.inc(result.written)
+        if result.ok:
+            ingested_statements.put((user_id, statement_hash), result.written)
+        else:
+            print(f"Bulk insert incomplete: {result.written}/{result.total} rows, {result.errors}")
+
+        # Keep the per-user running totals and anomaly baselines in step with what was
+        # actually stored; new rows are scored against their category as they land.
+        # Saving the summary moves the user's watermark, which retires their memoised /predict results
+        alerts = []
+        if result.written:
+            try:
+                with span("upload.summary"):
+                    _, alerts = await repo.record_ingested(user_id, result.written_rows(new_transactions))
+            except Exception as e:
+                print(f"Summary update failed for {user_id}: {e}")
+                try:
+                    await repo.touch_watermark(user_id)
+                except Exception as e:
+                    print(f"Watermark update failed for {user_id}: {e}")
+
+        return {
+            "status": "success" if result.ok else "partial",
+            "count": result.written,
+            "failed": result.failed,
+            "skipped": len(transactions) - len(new_transactions),
+            "dropped": dropped,
+            "alerts": alerts,
+            "message": f"Saved {result.written} of {len(new_transactions)} new transactions ({len(transactions)} parsed"
+                       + (f", {dropped} unreadable rows skipped)" if dropped else ")")
         }
-        return tag_map.get(category, category)
-        
-    return "Miscellaneous"
+
+    return {
+        "status": "error", 
+        "dropped": dropped,
+        "message": "No valid transactions found in the statement"
+    }
+
+def ingest_job(contents: bytes, user_id: str, filename: str = None, admission=None):
+    async def handler(job):
+        try:
+            result = await ingest_statement(contents, user_id, filename)
+        except Exception as e:
+            raise ValueError(f"Failed to process statement: {str(e)}")
+        finally:
+            # The upload slot taken over from the request (see admission.py)
+            if admission is not None:
+                admission.release()
+        if result["status"] == "error":
+            raise ValueError(result["message"])
+        return result
+    return handler
 
 @router.post("/upload")
 async def upload_statement(
+    request: Request,
     file: UploadFile = File(...),
-    user_id: str = Form(...)
+    user_id: str = Form(...),
+    background: bool = Form(False)
 ):
     """
-    Endpoint to upload and parse PDF bank statements.
-    Extracts transactions and stores them in Supabase.
+    Endpoint to upload and parse bank statements (PDF, CSV or XLSX).
+    PDFs are extracted page by page, tabular exports column by column (tabular.py).
+    With background=true it answers with a job id right away (see jobs.py).
+    Size and concurrency limits are enforced before this runs (see admission.py).
     """
-    temp_file = f"temp_{uuid.uuid4().hex}.pdf"
-    transactions = []
-
     try:
-        # Save uploaded file temporarily
-        contents = await file.read()
-        with open(temp_file, "wb") as f:
-            f.write(contents)
-
-        # Extract text from PDF
-        full_text = ""
-        with pdfplumber.open(temp_file) as pdf:
-            for page in pdf.pages:
-                text = page.extract_text()
-                if text:
-                    full_text += text + "\n"
-
-        # Split into blocks starting with a Date
-        lines = full_text.split('\n')
-        current_block = []
-        transaction_blocks = []
-        
-        for line in lines:
-            if re.match(r'^(\d{1,2}\s+(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)|(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)\s+\d{1,2})', line):
-                if current_block:
-                    transaction_blocks.append('\n'.join(current_block))
-                current_block = [line]
-            else:
-                current_block.append(line)
-        
-        if current_block:
-            transaction_blocks.append('\n'.join(current_block))
-
-        # Process each transaction block
-        for block in transaction_blocks:
-            name_pattern = r'(?:Paid to|Received from|Money sent to|Payment to|Automatic payment for)\s+(.*?)(?=\s{2,}|Tag:|UPI ID:|#|\n|$)'
-            name_match = re.search(name_pattern, block, re.IGNORECASE | re.DOTALL)
-            
-            if not name_match:
-                continue
-            
-            description = name_match.group(1).strip()
-            description = description.split('\n')[0].strip()
-            category = extract_category_dynamic(block)
-
-            amount_match = re.search(r'[+-]?\s*Rs\.?\s*([\d,]+\.?\d*)', block)
-            if not amount_match:
-                continue
-            amount_value = clean_amount(amount_match.group(0))
-
-            date_match = re.search(r'(\d{1,2}\s+(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec))', block)
-            if not date_match:
-                continue
-            
-            date_str = date_match.group(1).strip()
-            year = "2024" if "Dec" in date_str else "2025"
-            
-            try:
-                transaction_date = datetime.strptime(f"{date_str} {year}", "%d %b %Y").date().isoformat()
-            except ValueError:
-                continue
-
-            transactions.append({
-                "user_id": user_id,
-                "date": transaction_date,
-                "description": description,
-                "amount": amount_value,
-                "category": category
-            })
-
-        if transactions:
-            supabase.table("transactions").insert(transactions).execute()
-            return {
-                "status": "success", 
-                "count": len(transactions),
-                "message": f"Successfully parsed {len(transactions)} transactions"
-            }
+        with span("upload.read"):
+            contents = await file.read()
 
-        return {
-            "status": "error", 
-            "message": "No valid transactions found in the PDF"
-        }
+        if background:
+            admission = getattr(request.state, "admission", None)
+            job = job_queue.submit("upload", ingest_job(contents, user_id, file.filename, admission))
+            # Submitted, so the job now owns the slot and releases it once parsed
+            if admission is not None:
+                admission.detach()
+            return queued_response(job)
+
+        return await ingest_statement(contents, user_id, file.filename)
 
+    except QueueFullError as e:
+        # Not detached, so the admission slot is released with this response
+        return queue_full_response(e)
     except Exception as e:
+        errors_total.inc(stage="upload")
         return {
             "status": "error", 
-            "message": f"Failed to process PDF: {str(e)}"
+            "message": f"Failed to process statement: {str(e)}"
         }
-    
-    finally:
-        # Clean up temporary file
-        if os.path.exists(temp_file):
-            os.remove(temp_file)
 
 # Include the router in the app
 app.include_router(router)
+app.include_router(jobs_router)
 
 @app.get("/")
 def health_check():
@@ -172,5 +272,6 @@ def health_check():
 
 # For Railway Deployment
 if __name__ == "__main__":
+    import uvicorn
     port = int(os.environ.get("PORT", 8000))
     uvicorn.run(app, host="0.0.0.0", port=port)
@@ -0,0 +1,179 @@
+"""
+Admission control for statement uploads.
+
+An upload is admitted before its body is read. At most UPLOAD_CONCURRENCY
+uploads hold a slot at a time, and at most UPLOAD_QUEUE_SIZE more may wait
+for one. A request that finds the queue full, or waits longer than
+UPLOAD_QUEUE_TIMEOUT_SECONDS, gets a 429 with Retry-After. The body is
+counted while it streams in: a Content-Length over UPLOAD_MAX_BYTES is refused
+with 413 up front, and a body that grows past the cap is cut off with 413
+at that point. So at any moment a worker holds at most
+UPLOAD_CONCURRENCY * UPLOAD_MAX_BYTES of statement data.
+
+Before a rejection is sent, the rest of the body is read and thrown away, up to
+UPLOAD_DRAIN_BYTES, so an ordinary client gets the response instead of a reset
+connection. Clients that send 'Expect: 100-continue' are answered without
+ever sending the body.
+
+A background upload keeps its slot until its job has finished parsing
+(see Admission.detach), so queued jobs count against the same limit.
+"""
+import os
+import json
+import asyncio
+
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", 25 * 1024 * 1024))
+UPLOAD_CONCURRENCY = int(os.getenv("UPLOAD_CONCURRENCY", os.cpu_count() or 1))
+UPLOAD_QUEUE_SIZE = int(os.getenv("UPLOAD_QUEUE_SIZE", 16))
+UPLOAD_QUEUE_TIMEOUT_SECONDS = float(os.getenv("UPLOAD_QUEUE_TIMEOUT_SECONDS", 30))
+UPLOAD_RETRY_AFTER_SECONDS = int(os.getenv("UPLOAD_RETRY_AFTER_SECONDS", 5))
+UPLOAD_DRAIN_BYTES = int(os.getenv("UPLOAD_DRAIN_BYTES", 64 * 1024 * 1024))
+
+class AdmissionRejected(Exception):
+    pass
+
+class UploadTooLarge(Exception):
+    pass
+
+class Admission:
+    """ One held slot. Released once, by whoever ends up owning it. """
+
+    def __init__(self, gate):
+        self.gate = gate
+        self.released = False
+        self.detached = False
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            self.gate.semaphore.release()
+
+    def detach(self):
+        """ Takes the slot over from the request, e.g. for a background job; the caller must release it. """
+        self.detached = True
+        return self
+
+class AdmissionGate:
+    """ A semaphore with a bounded number of waiters. """
+
+    def __init__(self, limit: int = UPLOAD_CONCURRENCY, max_waiting: int = UPLOAD_QUEUE_SIZE,
+                 timeout: float = UPLOAD_QUEUE_TIMEOUT_SECONDS):
+        self.limit = max(limit, 1)
+        self.max_waiting = max_waiting
+        self.timeout = timeout
+        self.semaphore = asyncio.Semaphore(self.limit)
+        self.waiting = 0
+
+    async def acquire(self) -> Admission:
+        if not self.semaphore.locked():
+            # A free slot is taken without suspending, so it never counts as waiting
+            await self.semaphore.acquire()
+            return Admission(self)
+        if self.waiting >= self.max_waiting:
+            raise AdmissionRejected(f"Too many uploads in progress ({self.limit} parsing, {self.waiting} waiting), try again shortly")
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self.semaphore.acquire(), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            raise AdmissionRejected(f"No upload slot freed up within {self.timeout:.0f}s, try again shortly")
+        finally:
+            self.waiting -= 1
+        return Admission(self)
+
+    def stats(self) -> dict:
+        free = self.semaphore._value
+        return {"limit": self.limit, "active": self.limit - free, "waiting": self.waiting}
+
+upload_gate = AdmissionGate()
+
+async def send_error(send, status: int, message: str, headers: list = None):
+    body = json.dumps({"status": "error", "message": message}).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            *(headers or [])
+        ]
+    })
+    await send({"type": "http.response.body", "body": body})
+
+async def discard_body(scope, receive, received: int = 0, limit: int = UPLOAD_DRAIN_BYTES):
+    """ Reads and drops the unread request body chunk by chunk; gives up past `limit`. """
+    headers = dict(scope["headers"])
+    if received == 0 and headers.get(b"expect", b"").lower() == b"100-continue":
+        # Nothing is sent until the body is asked for, so there is nothing to drain
+        return
+    while received <= limit:
+        message = await receive()
+        if message["type"] != "http.request":
+            return
+        received += len(message.get("body", b""))
+        if not message.get("more_body", False):
+            return
+
+class UploadAdmissionMiddleware:
+    """ ASGI middleware applying the gate and the streaming size cap to POSTs on `paths`. """
+
+    def __init__(self, app, paths=("/upload",), gate: AdmissionGate = None, max_bytes: int = UPLOAD_MAX_BYTES):
+        self.app = app
+        self.paths = tuple(paths)
+        self.gate = gate or upload_gate
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        too_large_message = f"Upload exceeds the {round(self.max_bytes / (1024 * 1024), 2):g}MB limit"
+        length = dict(scope["headers"]).get(b"content-length")
+        if length is not None and length.isdigit() and int(length) > self.max_bytes:
+            await discard_body(scope, receive)
+            await send_error(send, 413, too_large_message)
+            return
+
+        try:
+            admission = await self.gate.acquire()
+        except AdmissionRejected as e:
+            await discard_body(scope, receive)
+            await send_error(send, 429, str(e), [(b"retry-after", str(UPLOAD_RETRY_AFTER_SECONDS).encode())])
+            return
+        # Endpoints find the slot on request.state.admission
+        scope.setdefault("state", {})["admission"] = admission
+
+        received = 0
+        too_large = False
+        started = False
+
+        async def limited_receive():
+            nonlocal received, too_large
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    too_large = True
+                    raise UploadTooLarge(too_large_message)
+            return message
+
+        async def guarded_send(message):
+            nonlocal started
+            # Whatever the app makes of the aborted body is replaced by the 413 below
+            if too_large:
+                return
+            if message["type"] == "http.response.start":
+                started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except UploadTooLarge:
+            pass
+        finally:
+            if not admission.detached:
+                admission.release()
+
+        if too_large and not started:
+            await discard_body(scope, receive, received)
+            await send_error(send, 413, too_large_message)
@@ -0,0 +1,132 @@
+from __future__ import annotations
+from clients import lazy_import
+from merchants import canonical_merchant
+
+np = lazy_import("numpy")
+
+DAYS_PER_MONTH = 30.44
+
+class TransactionFrame:
+    """
+    Columnar view of a transaction list. Rows are converted once into NumPy
+    columns, and every insight figure is computed from those arrays.
+    """
+
+    def __init__(self, transactions: list):
+        self.transactions = transactions
+        self.descriptions = [tx.get('description') or '' for tx in transactions]
+        self.date_strings = [tx.get('date') for tx in transactions]
+        self.amounts = np.fromiter((float(tx['amount']) for tx in transactions), dtype=np.float64, count=len(transactions))
+        self.dates = np.array([d or 'NaT' for d in self.date_strings], dtype='datetime64[D]')
+        self.spent = np.abs(self.amounts)
+        self.expense_mask = self.amounts < 0
+        self._masks = {}
+        self._merchants = None
+
+    def __len__(self):
+        return len(self.transactions)
+
+    # --- masks ---
+    def exclusion_mask(self, matcher) -> np.ndarray:
+        """ True for rows whose description matches `matcher` (exclusions.ExclusionMatcher). Cached per list. """
+        mask = self._masks.get(matcher.names)
+        if mask is None:
+            mask = np.array(matcher.mask(self.descriptions), dtype=bool)
+            self._masks[matcher.names] = mask
+        return mask
+
+    # --- period normalisation ---
+    def span_days(self) -> int:
+        """ Days between the first and last dated row (1 for a single dated row). """
+        valid = self.dates[~np.isnat(self.dates)]
+        if len(valid) <= 1:
+            return 1
+        return int((valid.max() - valid.min()).astype(int))
+
+    def num_months(self) -> float:
+        valid = np.count_nonzero(~np.isnat(self.dates))
+        if valid <= 1:
+            return 1
+        return max(1, round(self.span_days() / DAYS_PER_MONTH, 1))
+
+    def actual_monthly_expense(self) -> float:
+        return (self.expense_total() / max(self.span_days(), 1)) * DAYS_PER_MONTH
+
+    # --- aggregates ---
+    def expense_total(self, exclude: np.ndarray = None) -> float:
+        mask = self.expense_mask if exclude is None else self.expense_mask & ~exclude
+        return float(self.spent[mask].sum())
+
+    def savings(self, monthly_income: float, exclude: np.ndarray = None) -> dict:
+        """ Monthly-normalised expense, surplus and savings rate. """
+        num_months = self.num_months()
+        avg_monthly_expense = self.expense_total(exclude) / num_months
+        savings_amt = monthly_income - avg_monthly_expense
+        savings_rate = round((savings_amt / monthly_income * 100), 1) if monthly_income > 0 else 0
+        return {
+            "num_months": num_months,
+            "avg_monthly_expense": avg_monthly_expense,
+            "savings_amt": savings_amt,
+            "savings_rate": savings_rate
+        }
+
+    def top_expenses(self, k: int = 5, exclude: np.ndarray = None) -> list:
+        """ Row indices of the k largest expenses, largest first (ties keep row order). """
+        mask = self.expense_mask if exclude is None else self.expense_mask & ~exclude
+        candidates = np.flatnonzero(mask)
+        order = np.argsort(-self.spent[candidates], kind='stable')[:k]
+        return candidates[order].tolist()
+
+    # --- merchants ---
+    def merchant_codes(self) -> tuple:
+        """
+        (codes, ids): a dense integer code per row and the merchant id behind each
+        code. Rows ingested before merchant ids were stored are resolved from their description.
+        """
+        if self._merchants is None:
+            codes, ids, seen = np.empty(len(self.transactions), dtype=np.int64), [], {}
+            for i, tx in enumerate(self.transactions):
+                merchant_id = tx.get('merchant_id') or canonical_merchant(self.descriptions[i])[0]
+                code = seen.get(merchant_id)
+                if code is None:
+                    code = seen[merchant_id] = len(ids)
+                    ids.append(merchant_id)
+                codes[i] = code
+            self._merchants = (codes, ids)
+        return self._merchants
+
+    def top_merchants(self, k: int = 5, exclude: np.ndarray = None) -> list:
+        """ (merchant name, total spent) of the k merchants with the most expense, largest first. """
+        mask = self.expense_mask if exclude is None else self.expense_mask & ~exclude
+        codes, ids = self.merchant_codes()
+        if not mask.any():
+            return []
+        totals = np.bincount(codes[mask], weights=self.spent[mask], minlength=len(ids))
+        order = np.argsort(-totals, kind='stable')[:k]
+        # Display names from each merchant's first row, one lookup per merchant
+        first_row = {}
+        for i in np.flatnonzero(mask):
+            first_row.setdefault(int(codes[i]), int(i))
+        return [
+            (canonical_merchant(self.descriptions[first_row[code]])[1], float(totals[code]))
+            for code in order.tolist() if totals[code] > 0
+        ]
+
+    def anomalies(self, exclude: np.ndarray = None, z: float = 2.0, floor: float = 1000, min_count: int = 3) -> list:
+        """ Expenses more than `z` standard deviations above the mean and above `floor`. """
+        mask = self.expense_mask if exclude is None else self.expense_mask & ~exclude
+        idx = np.flatnonzero(mask)
+        if len(idx) <= min_count:
+            return []
+
+        values = self.spent[idx]
+        mean_val, std_val = values.mean(), values.std()
+        hits = np.flatnonzero((values > mean_val + z * std_val) & (values > floor))
+        return [
+            {
+                "date": self.date_strings[idx[i]],
+                "description": self.descriptions[idx[i]],
+                "reason": f"Spending is {round((values[i] - mean_val) / std_val, 1)}x higher than typical."
+            }
+            for i in hits
+        ]
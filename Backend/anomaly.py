@@ -0,0 +1,76 @@
+"""
+Streaming anomaly detection against per-category spending baselines.
+
+Each user's summary row keeps a running mean/variance (Welford) of their
+expense amounts per category. A new expense is scored against its category's
+baseline before being folded into it, so every transaction costs O(1) and
+alerts are raised at ingest time instead of by rescanning the history.
+A ₹5,000 rent payment is compared with past rent, not with food orders.
+"""
+import math
+import os
+
+# An expense is flagged when it is ANOMALY_Z standard deviations above its
+# category mean, above ANOMALY_FLOOR, and the category has ANOMALY_MIN_COUNT prior expenses
+ANOMALY_Z = float(os.getenv("ANOMALY_Z", 2.0))
+ANOMALY_FLOOR = float(os.getenv("ANOMALY_FLOOR", 1000))
+ANOMALY_MIN_COUNT = int(os.getenv("ANOMALY_MIN_COUNT", 3))
+# Spread floor as a fraction of the mean, so a category of identical amounts still has a scale
+ANOMALY_MIN_SPREAD = float(os.getenv("ANOMALY_MIN_SPREAD", 0.1))
+# Most recent alerts kept on the summary for /predict
+ANOMALY_KEEP = int(os.getenv("ANOMALY_KEEP", 20))
+
+def empty_baseline() -> dict:
+    return {"n": 0, "mean": 0.0, "m2": 0.0}
+
+def update_baseline(baseline: dict, value: float) -> dict:
+    """ Welford's update: folds one value into the running count, mean and squared deviations. """
+    baseline["n"] += 1
+    delta = value - baseline["mean"]
+    baseline["mean"] += delta / baseline["n"]
+    baseline["m2"] += delta * (value - baseline["mean"])
+    return baseline
+
+def baseline_std(baseline: dict) -> float:
+    """ Population standard deviation, as numpy's default std. """
+    if baseline["n"] == 0:
+        return 0.0
+    return math.sqrt(max(baseline["m2"], 0.0) / baseline["n"])
+
+def zscore(baseline: dict, value: float, min_spread: float = ANOMALY_MIN_SPREAD):
+    std = max(baseline_std(baseline), min_spread * abs(baseline["mean"]))
+    if std == 0:
+        return None
+    return (value - baseline["mean"]) / std
+
+class AnomalyDetector:
+    """ Scores expenses against, then folds them into, one user's category baselines (a plain dict). """
+
+    def __init__(self, baselines: dict, z: float = ANOMALY_Z, floor: float = ANOMALY_FLOOR,
+                 min_count: int = ANOMALY_MIN_COUNT):
+        self.baselines = baselines
+        self.z = z
+        self.floor = floor
+        self.min_count = min_count
+
+    def score(self, category: str, spent: float):
+        """ Z-score of `spent` if it is anomalous for `category`, else None. """
+        baseline = self.baselines.get(category)
+        if baseline is None or baseline["n"] < self.min_count or spent <= self.floor:
+            return None
+        z = zscore(baseline, spent)
+        return z if z is not None and z > self.z else None
+
+    def observe(self, tx: dict, category: str, spent: float):
+        """ Scores one expense, updates its baseline and returns an alert or None. """
+        z = self.score(category, spent)
+        update_baseline(self.baselines.setdefault(category, empty_baseline()), spent)
+        if z is None:
+            return None
+        return {
+            "date": tx.get("date"),
+            "description": tx.get("description") or "",
+            "category": category,
+            "amount": spent,
+            "reason": f"Spending is {round(z, 1)}x higher than typical for {category}."
+        }
@@ -0,0 +1,304 @@
+"""
+End-to-end benchmark of the service's hot paths on synthetic data.
+
+Statements and users come from benchmarks/synthetic.py. Requests go through
+the combined app (main.app) in-process over ASGI, against the in-memory
+repository and a canned LLM backend, so only our own code is on the clock.
+
+    upload_pdf[N] / upload_csv[N]   POST /upload of an N-row statement, one new user per request
+    insights[N]                     generate_spending_insights on N transactions
+    model_single / model_batch      predict_expense per row, predict_expenses on every profile at once
+    predict[N]                      POST /predict for a user with N stored transactions
+
+Each result has the count, wall time, throughput, p50/p99/mean latency and
+the peak RSS while it ran. They are written as JSON, and --compare prints
+the change against an earlier file (exit 1 past --max-regression).
+
+The model and /predict benchmarks need a trained bundle: the run stops
+before benchmarking anything if none loads, and --build-model trains a small
+one (BENCH_MODEL_TREES shallow trees) into a temporary directory first.
+
+Usage (from Backend/, after `python train_model.py`, or with --build-model):
+    python -m benchmarks.e2e_bench [--rows 200 2000] [--iterations 20] [--users 50]
+                                   [--concurrency 4] [--json e2e.json] [--build-model]
+                                   [--compare previous.json --max-regression 20]
+"""
+import argparse
+import asyncio
+import atexit
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+# The in-memory repository and no eager warm-up; set before the service modules are imported
+os.environ.setdefault("DB_BACKEND", "memory")
+os.environ.setdefault("WARM_UP", "0")
+os.environ.setdefault("JOB_PERSIST", "0")
+
+import httpx
+import numpy as np
+
+from benchmarks.synthetic import sample_profiles, statement_csv, statement_pdf, statement_rows, transaction_dicts
+
+FAKE_INSIGHTS = "💎 Fake insight about ₹1,000\n🚀 Another one about ₹2,000\n📉 A third about ₹300"
+
+def rss_mb() -> float:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+
+def peak_rss_mb() -> float:
+    """ High-water mark of the resident set (VmHWM). """
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1e3
+    return rss_mb()
+
+def reset_peak_rss():
+    # Linux resets VmHWM to the current RSS on '5'; elsewhere the peak just accumulates
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+def summarise(timings: list, wall: float, errors: int = 0, **extra) -> dict:
+    ms = np.array(timings) * 1000 if timings else np.zeros(1)
+    return {
+        "count": len(timings),
+        "errors": errors,
+        "wall_s": round(wall, 4),
+        "throughput_per_s": round(len(timings) / wall, 2) if wall > 0 else None,
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+        "mean_ms": round(float(ms.mean()), 3),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        **extra
+    }
+
+async def run_concurrent(call, payloads: list, concurrency: int) -> tuple:
+    """ Runs `await call(payload)` for every payload, `concurrency` at a time. Returns (timings, wall, errors). """
+    semaphore = asyncio.Semaphore(max(concurrency, 1))
+    timings, errors = [], 0
+
+    async def one(payload):
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            ok = await call(payload)
+            timings.append(time.perf_counter() - start)
+            errors += 0 if ok else 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(payload) for payload in payloads))
+    return timings, time.perf_counter() - start, errors
+
+async def bench_upload(client, kind: str, rows: int, iterations: int, concurrency: int) -> dict:
+    """ A distinct statement per request (new user, new seed), so no ingest cache short-circuits it. """
+    build = statement_pdf if kind == "pdf" else statement_csv
+    payloads = [(f"upload-{kind}-{rows}-{i}", build(statement_rows(rows, seed=i))) for i in range(iterations)]
+
+    async def call(payload):
+        user_id, body = payload
+        response = await client.post(
+            "/upload", data={"user_id": user_id}, files={"file": (f"statement.{kind}", body)}
+        )
+        return response.status_code == 200 and response.json().get("status") == "success"
+
+    reset_peak_rss()
+    timings, wall, errors = await run_concurrent(call, payloads, concurrency)
+    return summarise(timings, wall, errors, rows_per_s=round(rows * len(timings) / wall, 1),
+                     bytes_per_request=len(payloads[0][1]))
+
+def bench_insights(profiles: list, rows: int, iterations: int) -> dict:
+    from insights import generate_spending_insights
+    transactions = [transaction_dicts(statement_rows(rows, seed=i), "insights") for i in range(iterations)]
+
+    reset_peak_rss()
+    timings = []
+    start = time.perf_counter()
+    for i, txs in enumerate(transactions):
+        profile = profiles[i % len(profiles)]
+        profile_data = {
+            "monthly_income": profile["monthly_income"], "monthly_emi": profile["monthly_emi_usd"],
+            "interest_rate": profile["loan_interest_rate_pct"], "job_title": profile["job_title"],
+            "education_level": profile["education"]
+        }
+        began = time.perf_counter()
+        generate_spending_insights(profile_data, txs)
+        timings.append(time.perf_counter() - began)
+    return summarise(timings, time.perf_counter() - start)
+
+def bench_model(profiles: list, iterations: int) -> dict:
+    import spending
+    rows = [
+        spending.encode_profile(
+            p["monthly_income"], p["education"], p["employment"], p["job_title"], p["has_loan"], p["loan_type"],
+            p["loan_term_months"], p["monthly_emi_usd"], p["loan_interest_rate_pct"], p["credit_score"]
+        )
+        for p in profiles
+    ]
+
+    reset_peak_rss()
+    timings = []
+    start = time.perf_counter()
+    for i in range(iterations * len(rows)):
+        began = time.perf_counter()
+        spending.predict_expense(rows[i % len(rows)])
+        timings.append(time.perf_counter() - began)
+    single = summarise(timings, time.perf_counter() - start)
+
+    timings = []
+    start = time.perf_counter()
+    for _ in range(iterations):
+        began = time.perf_counter()
+        spending.predict_expenses(rows)
+        timings.append(time.perf_counter() - began)
+    wall = time.perf_counter() - start
+    batch = summarise(timings, wall, batch_size=len(rows), rows_per_s=round(len(rows) * iterations / wall, 1))
+    return {"model_single": single, "model_batch": batch}
+
+async def bench_predict(client, profiles: list, rows: int, concurrency: int) -> dict:
+    from repository import get_repository
+    repo = get_repository()
+    users = [{**profile, "user_id": f"{profile['user_id']}-{rows}"} for profile in profiles]
+    for i, user in enumerate(users):
+        await repo.insert_transactions(transaction_dicts(statement_rows(rows, seed=i), user["user_id"]))
+        await repo.rebuild_summary(user["user_id"])
+
+    async def call(user):
+        response = await client.post("/predict", data={key: str(value) for key, value in user.items()})
+        return response.status_code == 200 and response.json().get("status") == "success"
+
+    reset_peak_rss()
+    timings, wall, errors = await run_concurrent(call, users, concurrency)
+    return summarise(timings, wall, errors)
+
+# Size of the --build-model bundle: enough trees to time the model paths, quick to fit
+BENCH_MODEL_TREES = 10
+BENCH_MODEL_DEPTH = 8
+
+def build_model(data: str) -> str:
+    """ Trains a small bundle into a temporary directory and returns its root. """
+    out = tempfile.mkdtemp(prefix="bench-model-")
+    atexit.register(shutil.rmtree, out, ignore_errors=True)
+    subprocess.run([
+        sys.executable, "train_model.py", "--data", data, "--out", out,
+        "--trees", str(BENCH_MODEL_TREES), "--max-depth", str(BENCH_MODEL_DEPTH)
+    ], check=True)
+    return out
+
+async def run(args) -> dict:
+    import llm_client
+    import spending
+    from main import app
+
+    # Canned model output: the sync path goes through genai_client, the async one through InsightClient
+    class FakeModels:
+        def generate_content(self, model, contents):
+            time.sleep(args.llm_delay)
+            return type("Response", (), {"text": FAKE_INSIGHTS})()
+
+    llm_client.genai_client = type("FakeGenai", (), {"models": FakeModels()})()
+    llm_client.set_insight_client(llm_client.InsightClient(llm_client.FakeBackend(FAKE_INSIGHTS, delay=args.llm_delay)))
+    # An explicit --forest is a bare legacy artifact, so the bundle lookup is switched off
+    spending.BUNDLE_PATH = "" if args.forest else args.bundle
+    spending.FOREST_PATH = args.forest or spending.FOREST_PATH
+    if args.build_model:
+        spending.BUNDLE_PATH = build_model(args.data)
+    # Results without the model and /predict rows would compare as if nothing regressed
+    if spending.get_model() is None:
+        raise SystemExit(f"No model at {args.forest or args.bundle}: run train_model.py or pass --build-model")
+
+    profiles = sample_profiles(args.data, args.users)
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        for rows in args.rows:
+            for kind in ("pdf", "csv"):
+                name = f"upload_{kind}[{rows}]"
+                results[name] = await bench_upload(client, kind, rows, args.iterations, args.concurrency)
+                print(f"{name}: {results[name]}")
+
+            name = f"insights[{rows}]"
+            results[name] = bench_insights(profiles, rows, args.iterations)
+            print(f"{name}: {results[name]}")
+
+        results.update(bench_model(profiles, args.iterations))
+        for rows in args.rows:
+            name = f"predict[{rows}]"
+            results[name] = await bench_predict(client, profiles, rows, args.concurrency)
+            print(f"{name}: {results[name]}")
+    return results
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return ""
+
+def compare(current: dict, previous: dict, max_regression: float) -> int:
+    """ Prints p50 and throughput changes per benchmark; returns how many regressed past the threshold. """
+    regressions = 0
+    print(f"\n{'benchmark':<22}{'p50 ms':>22}{'throughput/s':>26}")
+    for name, now in current.items():
+        before = previous.get(name)
+        if not before:
+            continue
+        p50_change = (now["p50_ms"] / before["p50_ms"] - 1) * 100 if before["p50_ms"] else 0.0
+        tput_change = ((now["throughput_per_s"] or 0) / before["throughput_per_s"] - 1) * 100 if before.get("throughput_per_s") else 0.0
+        flag = ""
+        if max_regression is not None and (p50_change > max_regression or -tput_change > max_regression):
+            regressions += 1
+            flag = "  REGRESSION"
+        print(f"{name:<22}{before['p50_ms']:>9.2f} -> {now['p50_ms']:>8.2f} ({p50_change:+5.1f}%)"
+              f"{before['throughput_per_s'] or 0:>9.1f} -> {now['throughput_per_s'] or 0:>8.1f} ({tput_change:+5.1f}%){flag}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[200, 2000], help="transactions per statement/user")
+    parser.add_argument("--iterations", type=int, default=20, help="requests per upload/insights benchmark")
+    parser.add_argument("--users", type=int, default=50, help="synthetic users for model and /predict")
+    parser.add_argument("--concurrency", type=int, default=4, help="requests in flight at once")
+    parser.add_argument("--llm-delay", type=float, default=0.0, help="seconds the fake LLM takes per call")
+    parser.add_argument("--data", default="synthetic_personal_finance_dataset.csv")
+    parser.add_argument("--bundle", default="artifacts/spending", help="model bundle written by train_model.py")
+    parser.add_argument("--forest", default=None, help="a bare CompactForest directory instead of the bundle")
+    parser.add_argument("--build-model", action="store_true", help="train a small bundle for this run instead")
+    parser.add_argument("--json", default="e2e_bench.json", help="where to write the results")
+    parser.add_argument("--compare", help="earlier results file to diff against")
+    parser.add_argument("--max-regression", type=float, default=None,
+                        help="with --compare, exit 1 if any p50 or throughput is this many percent worse")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "args": vars(args)
+        },
+        "results": results
+    }
+    with open(args.json, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nWrote {len(results)} results to {args.json}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)["results"]
+        if compare(results, previous, args.max_regression):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
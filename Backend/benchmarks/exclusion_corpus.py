@@ -0,0 +1,71 @@
+"""
+Golden check and throughput benchmark for the exclusion matcher (exclusions.py).
+
+corpus/exclusions.json lists descriptions and whether DEFAULT_EXCLUSIONS
+leaves each one out, pinning the default list and its matching rules (names
+match anywhere in the description, ignoring case). The benchmark times the
+compiled matcher against the old per-name substring scan on synthetic
+descriptions.
+
+Usage (from Backend/):
+    python -m benchmarks.exclusion_corpus            # check + benchmark
+    python -m benchmarks.exclusion_corpus --write    # regenerate expectations
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+from exclusions import DEFAULT_EXCLUSIONS, ExclusionMatcher
+from benchmarks.synthetic import statement_rows, transaction_dicts
+
+CORPUS_PATH = Path(__file__).parent / "corpus" / "exclusions.json"
+
+def naive_matches(names, text: str) -> bool:
+    """ The scan insights.py used before exclusions.py. """
+    return any(name.lower() in text.lower() for name in names)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=20000, help="synthetic descriptions to time")
+    parser.add_argument("--names", type=int, nargs="+", default=[5, 50, 500], help="list sizes to time")
+    parser.add_argument("--write", action="store_true", help="overwrite expectations with current output")
+    args = parser.parse_args()
+
+    corpus = json.loads(CORPUS_PATH.read_text(encoding="utf-8"))
+    matcher = ExclusionMatcher(DEFAULT_EXCLUSIONS)
+    failures = 0
+    for case in corpus["cases"]:
+        excluded = matcher.matches(case["description"])
+        if args.write:
+            case["excluded"] = excluded
+        elif excluded != case["excluded"]:
+            failures += 1
+            print(f"FAIL {case['description']!r}: excluded={excluded}, expected {case['excluded']}")
+    if args.write:
+        corpus["defaults"] = list(DEFAULT_EXCLUSIONS)
+        CORPUS_PATH.write_text(json.dumps(corpus, indent=2, ensure_ascii=False) + "\n", encoding="utf-8")
+    elif list(DEFAULT_EXCLUSIONS) != corpus["defaults"]:
+        failures += 1
+        print(f"FAIL defaults: {list(DEFAULT_EXCLUSIONS)}, expected {corpus['defaults']}")
+    print(f"{'FAIL' if failures else 'ok  '} {len(corpus['cases'])} default-list cases")
+
+    descriptions = [tx["description"] for tx in transaction_dicts(statement_rows(args.rows), "bench")]
+    for size in args.names:
+        names = list(DEFAULT_EXCLUSIONS) + [f"Payee {i:04d}" for i in range(max(size - len(DEFAULT_EXCLUSIONS), 0))]
+        compiled = ExclusionMatcher(names)
+        start = time.perf_counter()
+        fast = compiled.mask(descriptions)
+        fast_s = time.perf_counter() - start
+        start = time.perf_counter()
+        slow = [naive_matches(names, text) for text in descriptions]
+        slow_s = time.perf_counter() - start
+        if fast != slow:
+            failures += 1
+            print(f"FAIL {size} names: compiled and naive disagree on {sum(a != b for a, b in zip(fast, slow))} rows")
+        print(f"{size:>5} names: naive {slow_s:.3f}s, compiled {fast_s:.3f}s on {len(descriptions)} descriptions")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,78 @@
+"""
+Checks the compact forest against the pickled scikit-learn model and compares
+per-request latency and resident memory.
+
+Usage (from Backend/, after `python train_model.py --pickle`):
+    python -m benchmarks.forest_bench [--bundle artifacts/spending] [--rows 5000] [--requests 500]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+from model_bundle import PICKLE_NAME, load_bundle, resolve_bundle
+
+def rss_mb() -> float:
+    """ Current resident set size of this process. """
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+
+def load_features(path: str, rows: int, manifest: dict) -> np.ndarray:
+    """ The first `rows` rows of the dataset, encoded by train_model.py with the bundle's encodings. """
+    import pandas as pd
+    from train_model import COLUMN_DTYPES, encode_chunk
+    chunk = pd.read_csv(path, usecols=list(COLUMN_DTYPES), dtype=COLUMN_DTYPES, nrows=rows)
+    vocabularies = {col: dict(codes) for col, codes in manifest["encodings"].items()}
+    return encode_chunk(chunk, vocabularies)[0].astype(np.float64)
+
+def per_request_ms(predict, X, requests: int) -> tuple:
+    timings = []
+    for i in range(requests):
+        row = X[i % len(X)]
+        start = time.perf_counter()
+        predict(row)
+        timings.append((time.perf_counter() - start) * 1000)
+    return np.percentile(timings, 50), np.percentile(timings, 99)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bundle", default="artifacts/spending")
+    parser.add_argument("--data", default="synthetic_personal_finance_dataset.csv")
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--requests", type=int, default=500)
+    args = parser.parse_args()
+
+    base = rss_mb()
+    forest, manifest = load_bundle(args.bundle)
+    forest_rss = rss_mb() - base
+    features = manifest["feature_order"]
+
+    X = load_features(args.data, args.rows, manifest)
+
+    import joblib
+    import pandas as pd
+    base = rss_mb()
+    model = joblib.load(os.path.join(resolve_bundle(args.bundle), PICKLE_NAME))
+    model_rss = rss_mb() - base
+
+    expected = model.predict(pd.DataFrame(X, columns=features))
+    actual = forest.predict(X)
+    max_diff = float(np.abs(expected - actual).max())
+
+    sk_p50, sk_p99 = per_request_ms(lambda row: model.predict(pd.DataFrame([row], columns=features)), X, args.requests // 5)
+    cf_p50, cf_p99 = per_request_ms(forest.predict_one, X, args.requests)
+
+    start = time.perf_counter()
+    forest.predict(X)
+    batch_rate = len(X) / (time.perf_counter() - start)
+
+    print(f"rows checked          {len(X)}  max |diff| = {max_diff:.2e}")
+    print(f"sklearn + DataFrame   p50 {sk_p50:.3f} ms  p99 {sk_p99:.3f} ms  rss +{model_rss:.0f} MB")
+    print(f"compact forest        p50 {cf_p50:.3f} ms  p99 {cf_p99:.3f} ms  rss +{forest_rss:.0f} MB")
+    print(f"compact forest batch  {batch_rate:,.0f} rows/s")
+    return 0 if max_diff < 1e-6 else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
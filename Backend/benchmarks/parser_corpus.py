@@ -0,0 +1,93 @@
+"""
+Golden-corpus check and throughput benchmark for the statement parsers.
+
+Each corpus/<name>.txt holds page texts separated by form feeds, and
+corpus/<name>.json holds the expected rows plus an optional period_end for
+statements without a year-bearing header. Each corpus/<name>.csv is a
+tabular export (tabular.py); its .json also holds the count of rows dropped.
+
+Usage (from Backend/):
+    python -m benchmarks.parser_corpus               # check + benchmark
+    python -m benchmarks.parser_corpus --write       # regenerate expectations
+"""
+import argparse
+import json
+import sys
+import time
+from datetime import date
+from pathlib import Path
+
+from tokenizer import StatementCalendar, tokenize_statement
+from tabular import parse_tabular
+
+CORPUS_DIR = Path(__file__).parent / "corpus"
+CORPUS_USER = "corpus-user"
+# pandas makes a tabular parse far slower than a tokenizer pass; time fewer of them
+TABULAR_REPEAT_DIVISOR = 100
+
+def load_case(path: Path):
+    expected_path = path.with_suffix(".json")
+    expected = json.loads(expected_path.read_text()) if expected_path.exists() else {}
+    if path.suffix == ".csv":
+        return path.read_bytes(), expected
+    return path.read_text(encoding="utf-8").split("\f"), expected
+
+def parse_case(source, expected) -> tuple:
+    """ (rows, rows dropped) of a case; dropped is None for tokenizer cases. """
+    if isinstance(source, bytes):
+        return parse_tabular(source, "csv", CORPUS_USER)
+    period_end = expected.get("period_end")
+    calendar = StatementCalendar(date.fromisoformat(period_end) if period_end else None)
+    return list(tokenize_statement(source, CORPUS_USER, calendar=calendar)), None
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=2000, help="parse passes per case for timing")
+    parser.add_argument("--write", action="store_true", help="overwrite expected rows with current output")
+    args = parser.parse_args()
+
+    failures = 0
+    total_rows = total_bytes = 0
+    total_seconds = 0.0
+
+    for path in sorted([*CORPUS_DIR.glob("*.txt"), *CORPUS_DIR.glob("*.csv")]):
+        source, expected = load_case(path)
+        rows, dropped = parse_case(source, expected)
+
+        if args.write:
+            expected["transactions"] = rows
+            if dropped is not None:
+                expected["dropped"] = dropped
+            path.with_suffix(".json").write_text(json.dumps(expected, indent=2, ensure_ascii=False) + "\n")
+        elif rows != expected.get("transactions"):
+            failures += 1
+            print(f"FAIL {path.name}: got {len(rows)} rows, expected {len(expected.get('transactions', []))}")
+            continue
+        elif dropped != expected.get("dropped"):
+            failures += 1
+            print(f"FAIL {path.name}: dropped {dropped} rows, expected {expected.get('dropped')}")
+            continue
+
+        tabular = isinstance(source, bytes)
+        repeat = max(args.repeat // TABULAR_REPEAT_DIVISOR, 1) if tabular else args.repeat
+        start = time.perf_counter()
+        for _ in range(repeat):
+            parse_case(source, expected)
+        elapsed = time.perf_counter() - start
+
+        if tabular:
+            # Reported apart: the totals below are the tokenizer's text throughput
+            print(f"ok   {path.name}: {len(rows)} rows, {dropped} dropped, {len(rows) * repeat / elapsed:,.0f} rows/s")
+            continue
+        size = sum(len(page) for page in source)
+        total_rows += len(rows) * repeat
+        total_bytes += size * repeat
+        total_seconds += elapsed
+        print(f"ok   {path.name}: {len(rows)} rows, {len(rows) * repeat / elapsed:,.0f} rows/s")
+
+    if total_seconds:
+        print(f"\n{total_rows / total_seconds:,.0f} rows/s, {total_bytes / total_seconds / 1e6:.1f} MB/s of statement text")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,130 @@
+"""
+Startup profile: per-package import cost and time-to-first-request of a service.
+
+Each measurement runs in a fresh interpreter, so nothing is already imported.
+Exits non-zero when time-to-first-request exceeds --max-ms, which lets CI
+catch a heavy import creeping back onto the startup path.
+
+Usage (from Backend/):
+    python -m benchmarks.startup_profile [--module spending] [--path /] [--top 15]
+                                         [--json startup.json] [--max-ms 1500]
+"""
+import argparse
+import json
+import subprocess
+import sys
+
+# Runs in the child interpreter: import the service, then serve one GET through ASGI
+FIRST_REQUEST_SCRIPT = """
+import asyncio, json, os, sys, time
+start = time.perf_counter()
+module = __import__(sys.argv[1])
+imported = time.perf_counter()
+
+async def get(app, path):
+    sent = []
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+    async def send(message):
+        sent.append(message)
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"",
+        "headers": [(b"host", b"localhost")], "client": ("127.0.0.1", 0), "server": ("localhost", 80),
+        "root_path": ""
+    }
+    await app(scope, receive, send)
+    return next(m["status"] for m in sent if m["type"] == "http.response.start")
+
+status = asyncio.run(get(module.app, sys.argv[2]))
+served = time.perf_counter()
+with open("/proc/self/statm") as f:
+    rss = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+print(json.dumps({
+    "status": status,
+    "import_ms": (imported - start) * 1000,
+    "first_request_ms": (served - imported) * 1000,
+    "time_to_first_request_ms": (served - start) * 1000,
+    "rss_mb": rss
+}))
+"""
+
+def parse_importtime(stderr: str) -> list:
+    """ Parses `python -X importtime` output into (package, self_us, cumulative_us, depth) rows. """
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return rows
+
+def import_profile(module: str, top: int) -> dict:
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, check=True
+    )
+    rows = parse_importtime(result.stderr)
+
+    # Output is post-order: the module's subtree is the run of deeper rows just before it
+    end = next(i for i in range(len(rows) - 1, -1, -1) if rows[i][0] == module and rows[i][3] == 0)
+    begin = end
+    while begin > 0 and rows[begin - 1][3] > 0:
+        begin -= 1
+    total = rows[end][2]
+
+    # Direct and second-level imports of the service are the ones worth acting on
+    packages = {}
+    for name, _, cumulative, depth in rows[begin:end]:
+        if depth in (1, 2):
+            root = name.split(".")[0]
+            packages[root] = max(packages.get(root, 0), cumulative)
+    slowest = sorted(packages.items(), key=lambda item: -item[1])[:top]
+    return {
+        "total_ms": total / 1000,
+        "packages": [{"package": name, "cumulative_ms": us / 1000} for name, us in slowest]
+    }
+
+def first_request(module: str, path: str) -> dict:
+    result = subprocess.run(
+        [sys.executable, "-c", FIRST_REQUEST_SCRIPT, module, path],
+        capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="spending", help="service module exposing `app`")
+    parser.add_argument("--path", default="/", help="GET path used as the first request")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--json", help="write the report to this file")
+    parser.add_argument("--max-ms", type=float, help="fail when time-to-first-request exceeds this")
+    args = parser.parse_args()
+
+    report = {
+        "module": args.module,
+        "python": sys.version.split()[0],
+        "imports": import_profile(args.module, args.top),
+        "startup": first_request(args.module, args.path)
+    }
+
+    startup = report["startup"]
+    print(f"import {args.module:<20} {report['imports']['total_ms']:8.1f} ms (-X importtime)")
+    for row in report["imports"]["packages"]:
+        print(f"  {row['package']:<24} {row['cumulative_ms']:8.1f} ms")
+    print(f"import (wall)               {startup['import_ms']:8.1f} ms")
+    print(f"first GET {args.path:<17} {startup['first_request_ms']:8.1f} ms  (HTTP {startup['status']})")
+    print(f"time to first request       {startup['time_to_first_request_ms']:8.1f} ms  rss {startup['rss_mb']:.0f} MB")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.max_ms is not None and startup["time_to_first_request_ms"] > args.max_ms:
+        print(f"FAIL: time to first request exceeds {args.max_ms:.0f} ms")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
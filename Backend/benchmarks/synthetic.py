@@ -0,0 +1,157 @@
+"""
+Synthetic inputs for the benchmarks: bank statements in the layout Parser.py
+reads (as PDF and CSV) and user profiles drawn from the bundled dataset.
+
+Everything is seeded, so a given size and seed always produce the same bytes
+and the same numbers can be compared from one commit to the next.
+
+    rows = statement_rows(500, seed=1)
+    pdf, csv = statement_pdf(rows), statement_csv(rows)
+    users = sample_profiles("synthetic_personal_finance_dataset.csv", 50)
+"""
+import csv
+import io
+import random
+from datetime import date, timedelta
+
+from tokenizer import normalise_category
+
+# (counterparty, category, typical amount) for debits; credits are salary and refunds
+MERCHANTS = [
+    ("Swiggy", "Food", 450), ("Zomato", "Food", 380), ("BigBasket", "Groceries", 1800),
+    ("Blinkit", "Groceries", 650), ("Uber India", "Travel", 320), ("Ola", "Travel", 280),
+    ("Apollo Pharmacy", "Medical", 900), ("Netflix", "Subscriptions", 199), ("Spotify", "Subscriptions", 119),
+    ("Airtel Postpaid", "Bills", 599), ("Amazon", "Shopping", 2400), ("Myntra", "Shopping", 1900),
+    ("Landlord Rent", "Transfers", 15000), ("IRCTC", "Travel", 1450), ("BookMyShow", "Entertainment", 600)
+]
+CREDITS = [("ACME Payroll", "Money Received", 60000), ("Rahul Sharma", "Money Received", 1200)]
+
+PREFIX_DEBIT = ("Paid to", "Payment to", "Money sent to", "Automatic payment for")
+PREFIX_CREDIT = "Received from"
+ROWS_PER_PAGE = 40
+
+def statement_rows(count: int, seed: int = 0, start: date = date(2025, 1, 1), days: int = 365) -> list:
+    """ `count` transactions in date order: (date, prefix, counterparty, amount, tag). Debits are negative. """
+    rnd = random.Random(seed)
+    rows = []
+    for _ in range(count):
+        tx_date = start + timedelta(days=rnd.randrange(days))
+        if rnd.random() < 0.08:
+            name, tag, typical = rnd.choice(CREDITS)
+            prefix, sign = PREFIX_CREDIT, 1
+        else:
+            name, tag, typical = rnd.choice(MERCHANTS)
+            prefix, sign = rnd.choice(PREFIX_DEBIT), -1
+        # Occasional large outliers give the anomaly detector something to find
+        scale = rnd.uniform(4, 8) if rnd.random() < 0.02 else rnd.uniform(0.5, 1.5)
+        rows.append((tx_date, prefix, name, sign * round(typical * scale, 2), tag))
+    rows.sort(key=lambda row: row[0])
+    return rows
+
+def format_rs(amount: float) -> str:
+    """ 'Rs. 1,234.50' with an explicit sign; the tokenizer reads the direction from the sign alone. """
+    sign = "+" if amount > 0 else "-"
+    return f"{sign}Rs. {abs(amount):,.2f}"
+
+def statement_pages(rows: list, rows_per_page: int = ROWS_PER_PAGE) -> list:
+    """ Page texts as lists of lines: a period header, then date-anchored blocks. """
+    if not rows:
+        return [["Transaction Statement"]]
+    first, last = rows[0][0], rows[-1][0]
+    header = [
+        "Transaction Statement for 98XXXXXX12",
+        f"{first:%d %b %Y} - {last:%d %b %Y}",
+        "Date Transaction Details Type Amount"
+    ]
+    pages = []
+    for offset in range(0, len(rows), rows_per_page):
+        lines = list(header) if offset == 0 else []
+        for tx_date, prefix, name, amount, tag in rows[offset:offset + rows_per_page]:
+            lines.append(f"{tx_date:%d %b} {prefix} {name}")
+            lines.append(f"{'CREDIT' if amount > 0 else 'DEBIT'} {format_rs(amount)}")
+            lines.append(f"#{tag}")
+        lines.append(f"Page {offset // rows_per_page + 1} of {(len(rows) + rows_per_page - 1) // rows_per_page}")
+        pages.append(lines)
+    return pages
+
+def pdf_escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+def build_pdf(pages: list) -> bytes:
+    """ A minimal text-only PDF (Helvetica, one line per text row) with no external dependency. """
+    objects = []
+
+    def add(body: bytes) -> int:
+        objects.append(body)
+        return len(objects)
+
+    font = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    # Page objects need the id of the Pages node, which comes right after the page content
+    pages_id = len(objects) + 2 * len(pages) + 1
+    page_ids = []
+    for lines in pages:
+        # Rs. is kept in ASCII; the PDF font has no rupee glyph
+        text = " ".join(f"({pdf_escape(line)}) Tj T*" for line in lines)
+        stream = f"BT /F1 9 Tf 36 806 Td 11 TL {text} ET".encode("latin-1", "replace")
+        content = add(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        page_ids.append(add(
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 595 842] /Contents %d 0 R "
+            b"/Resources << /Font << /F1 %d 0 R >> >> >>" % (pages_id, content, font)
+        ))
+    kids = b" ".join(b"%d 0 R" % page_id for page_id in page_ids)
+    add(b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(page_ids)))
+    catalog = add(b"<< /Type /Catalog /Pages %d 0 R >>" % pages_id)
+
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(out.tell())
+        out.write(b"%d 0 obj\n%s\nendobj\n" % (number, body))
+    xref = out.tell()
+    out.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+    out.write(b"".join(b"%010d 00000 n \n" % offset for offset in offsets))
+    out.write(b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, catalog, xref))
+    return out.getvalue()
+
+def statement_pdf(rows: list) -> bytes:
+    return build_pdf(statement_pages(rows))
+
+def statement_csv(rows: list) -> bytes:
+    """ The same transactions as a bank CSV export (tabular.py's column aliases). """
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(["Txn Date", "Narration", "Amount", "Category"])
+    for tx_date, prefix, name, amount, tag in rows:
+        writer.writerow([f"{tx_date:%d/%m/%Y}", f"{prefix} {name}", format_rs(amount), f"#{tag}"])
+    return out.getvalue().encode("utf-8")
+
+def transaction_dicts(rows: list, user_id: str) -> list:
+    """ Rows as they are stored after ingest, for seeding a repository directly. """
+    return [
+        {"user_id": user_id, "date": tx_date.isoformat(), "description": name, "amount": amount,
+         "category": normalise_category(tag)}
+        for tx_date, _, name, amount, tag in rows
+    ]
+
+def sample_profiles(path: str, count: int, seed: int = 0) -> list:
+    """ /predict form fields for `count` users sampled from the finance dataset. """
+    with open(path, newline="") as f:
+        records = list(csv.DictReader(f))
+    rnd = random.Random(seed)
+    profiles = []
+    for i, record in enumerate(rnd.sample(records, min(count, len(records)))):
+        profiles.append({
+            "user_id": f"bench-{seed}-{i}",
+            "monthly_income": float(record["monthly_income_usd"]),
+            "job_title": record["job_title"],
+            "education": record["education_level"],
+            "employment": record["employment_status"],
+            "has_loan": record["has_loan"],
+            "loan_type": record["loan_type"] or "None",
+            "loan_term_months": int(float(record["loan_term_months"] or 0)),
+            "monthly_emi_usd": float(record["monthly_emi_usd"] or 0),
+            "loan_interest_rate_pct": float(record["loan_interest_rate_pct"] or 0),
+            "credit_score": int(float(record["credit_score"] or 700))
+        })
+    return profiles
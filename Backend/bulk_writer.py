@@ -0,0 +1,132 @@
+import os
+import asyncio
+import random
+from dataclasses import dataclass, field
+from functools import lru_cache
+
+# Defaults can be tuned per deployment without code changes
+BULK_BATCH_SIZE = int(os.getenv("BULK_BATCH_SIZE", 500))
+BULK_CONCURRENCY = int(os.getenv("BULK_CONCURRENCY", 4))
+BULK_MAX_RETRIES = int(os.getenv("BULK_MAX_RETRIES", 3))
+BULK_BACKOFF_SECONDS = float(os.getenv("BULK_BACKOFF_SECONDS", 0.5))
+
+@lru_cache(maxsize=None)
+def pre_commit_errors() -> tuple:
+    """
+    Failures that happen before the server applies a write: the connection was never made, or
+    PostgREST answered with an error (its transaction rolled back). A timeout or a dropped
+    connection after sending may follow a commit, so only idempotent writes retry those.
+    Imported on the first failed write, not when the service starts.
+    """
+    import httpx
+    from postgrest.exceptions import APIError
+    return (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout, APIError)
+
+def retry_is_safe(error: Exception, idempotent: bool) -> bool:
+    return idempotent or getattr(error, "pre_commit", False) or isinstance(error, pre_commit_errors())
+
+@dataclass
+class BulkWriteResult:
+    """ Outcome of a bulk write, batch by batch. """
+    total: int = 0
+    written: int = 0
+    batches: int = 0
+    batch_size: int = 0
+    failed_batches: list = field(default_factory=list)
+    errors: list = field(default_factory=list)
+    # Conflict-key values the server already had (ignore_duplicates writes)
+    duplicates: set = field(default_factory=set)
+    key: str = None
+
+    @property
+    def failed(self) -> int:
+        return self.total - self.written - len(self.duplicates)
+
+    @property
+    def ok(self) -> bool:
+        return not self.failed_batches
+
+    def written_rows(self, rows: list) -> list:
+        """ The subset of `rows` that landed, given the rows that were submitted (with their conflict keys). """
+        failed = set(self.failed_batches)
+        return [
+            row for index, batch in enumerate(iter_batches(rows, self.batch_size))
+            if index not in failed for row in batch
+            if not self.duplicates or row.get(self.key) not in self.duplicates
+        ]
+
+def iter_batches(rows: list, batch_size: int):
+    for start in range(0, len(rows), batch_size):
+        yield rows[start:start + batch_size]
+
+async def bulk_insert(
+    client,
+    table_name: str,
+    rows: list,
+    on_conflict: str = None,
+    ignore_duplicates: bool = False,
+    batch_size: int = None,
+    concurrency: int = None,
+    max_retries: int = None,
+    backoff: float = None,
+    on_progress=None,
+    executor=None
+) -> BulkWriteResult:
+    """
+    Inserts `rows` in batches of `batch_size`, with at most `concurrency`
+    batches in flight. Each batch is retried with exponential backoff, and a
+    batch that still fails is recorded without discarding the others.
+    `on_progress(written, total)` is called after every successful batch.
+    With `on_conflict` the batches are upserted on those columns instead, and
+    with `ignore_duplicates` rows whose key already exists are left alone and
+    reported in `duplicates`. Such writes are idempotent and retry on any
+    error; a plain insert retries only pre_commit_errors().
+    Blocking client calls run on `executor` (the loop's default if None).
+    """
+    batch_size = max(batch_size or BULK_BATCH_SIZE, 1)
+    max_retries = BULK_MAX_RETRIES if max_retries is None else max_retries
+    backoff = BULK_BACKOFF_SECONDS if backoff is None else backoff
+    semaphore = asyncio.Semaphore(max(concurrency or BULK_CONCURRENCY, 1))
+
+    result = BulkWriteResult(total=len(rows), batch_size=batch_size, key=on_conflict if ignore_duplicates else None)
+    loop = asyncio.get_running_loop()
+
+    def insert_batch(batch):
+        # The Supabase client is blocking, so each batch runs in a worker thread
+        if on_conflict:
+            if ignore_duplicates:
+                return client.table(table_name).upsert(batch, on_conflict=on_conflict, ignore_duplicates=True).execute()
+            return client.table(table_name).upsert(batch, on_conflict=on_conflict).execute()
+        return client.table(table_name).insert(batch).execute()
+
+    async def write(index, batch):
+        async with semaphore:
+            for attempt in range(max_retries + 1):
+                try:
+                    response = await loop.run_in_executor(executor, insert_batch, batch)
+                    break
+                except Exception as e:
+                    if attempt == max_retries or not retry_is_safe(e, bool(on_conflict)):
+                        result.failed_batches.append(index)
+                        result.errors.append(f"batch {index}: {e}")
+                        return
+                    # Full jitter keeps retries from concurrent batches apart
+                    await asyncio.sleep(random.uniform(0, backoff * (2 ** attempt)))
+
+        landed = len(batch)
+        # Rows missing from the first attempt's answer were already stored by someone else.
+        # After a retry they may be this call's own earlier, unacknowledged write, so they count
+        if ignore_duplicates and attempt == 0 and response.data is not None:
+            returned = {row.get(on_conflict) for row in response.data}
+            skipped = {row.get(on_conflict) for row in batch} - returned
+            result.duplicates |= skipped
+            landed -= sum(1 for row in batch if row.get(on_conflict) in skipped)
+        result.written += landed
+        if on_progress:
+            on_progress(result.written, result.total)
+
+    batches = list(iter_batches(rows, batch_size))
+    result.batches = len(batches)
+    await asyncio.gather(*(write(index, batch) for index, batch in enumerate(batches)))
+    result.failed_batches.sort()
+    return result
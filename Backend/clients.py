@@ -0,0 +1,25 @@
+import sys
+import importlib.util
+
+def lazy_import(name: str):
+    """
+    Returns module `name`, deferring its actual import until an attribute is
+    first used. Keeps heavy dependencies off the service's import path.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError(f"No module named '{name}'", name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+def preload(*names: str):
+    """ Completes the given (possibly lazy) imports now, e.g. in a pre-fork master. """
+    for name in names:
+        # Any attribute access finishes loading a lazily imported module
+        getattr(lazy_import(name), "__name__")
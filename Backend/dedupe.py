@@ -0,0 +1,44 @@
+import hashlib
+from collections import Counter
+
+def content_hash(data: bytes) -> str:
+    """ Content address of an uploaded statement. """
+    return hashlib.sha256(data).hexdigest()
+
+def transaction_key(tx: dict) -> tuple:
+    """ Normalised (user_id, date, description, amount) identity of a transaction row. """
+    return (
+        str(tx.get("user_id", "")),
+        str(tx.get("date", "")),
+        " ".join(str(tx.get("description", "")).split()).casefold(),
+        f"{float(tx.get('amount', 0)):.2f}"
+    )
+
+def transaction_fingerprint(tx: dict, occurrence: int = 1) -> str:
+    """
+    Stable fingerprint of a transaction. The occurrence number keeps genuinely
+    repeated rows (two identical coffees on the same day) apart.
+    """
+    raw = "|".join(transaction_key(tx) + (str(occurrence),))
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+def iter_fingerprints(transactions):
+    """ Yields (fingerprint, tx) for each row, numbering identical rows in order. """
+    seen = Counter()
+    for tx in transactions:
+        key = transaction_key(tx)
+        seen[key] += 1
+        yield transaction_fingerprint(tx, seen[key]), tx
+
+def with_fingerprints(transactions: list) -> list:
+    """ The rows with their `fingerprint` column set (numbered over the whole list); set ones are kept. """
+    return [tx if tx.get("fingerprint") else {**tx, "fingerprint": fingerprint} for fingerprint, tx in iter_fingerprints(transactions)]
+
+def filter_new_transactions(transactions: list, existing: list) -> list:
+    """
+    Returns the rows of `transactions` whose fingerprints are not in `existing`,
+    each carrying its fingerprint. The stored column is unique, so a retried
+    insert of the same rows cannot add them twice.
+    """
+    known = {fingerprint for fingerprint, _ in iter_fingerprints(existing)}
+    return [{**tx, "fingerprint": fingerprint} for fingerprint, tx in iter_fingerprints(transactions) if fingerprint not in known]
@@ -0,0 +1,102 @@
+"""
+Per-user exclusion lists: payees such as self-transfers, family members and
+cash withdrawals that insights, anomaly detection and the savings figures
+leave out.
+
+Each list is compiled into one matcher: a single case-insensitive regex built
+from a trie of the names, so a description is scanned once and common
+prefixes are tried once however long the list grows. A name matches anywhere in the description, as the old hardcoded
+blacklists did ('Cash' also excludes 'Cashback'). Compiled matchers are kept
+in an LRU cache, shared by every user with the same list. Users' lists are
+read from the database on each request, so a change made through any worker
+applies at once. Users without a stored list get DEFAULT_EXCLUSIONS.
+
+DEFAULT_EXCLUSIONS is the union of the three lists insights.py used to keep:
+the Gemini prompt's five names, the template fallback's two, and the anomaly
+check's 'Aakansha' (which covers the full name). The template insights and
+the anomaly check therefore also leave out Cash, Self and Transfer rows now.
+benchmarks/exclusion_corpus.py pins which descriptions the default list excludes.
+"""
+import os
+import re
+from cache import LRUCache
+
+EXCLUSION_TABLE = "exclusion_lists"
+DEFAULT_EXCLUSIONS = tuple(
+    name.strip() for name in os.getenv("DEFAULT_EXCLUSIONS", "Aakansha,BANARSHI,Cash,Self,Transfer").split(",")
+    if name.strip()
+)
+EXCLUSION_CACHE_SIZE = int(os.getenv("EXCLUSION_CACHE_SIZE", 1024))
+
+def normalise_names(names) -> tuple:
+    """ Canonical form of a list: casefolded, whitespace collapsed, de-duplicated and sorted. """
+    return tuple(sorted({" ".join(name.split()).casefold() for name in names if name and name.strip()}))
+
+def trie_pattern(node: dict) -> str:
+    """ Regex for the names in a character trie, sharing their common prefixes. """
+    end = "" in node
+    branches = [
+        # Inner whitespace matches any run of it, as the names were collapsed to single spaces
+        (r"\s+" if char == " " else re.escape(char)) + trie_pattern(child)
+        for char, child in sorted(node.items()) if char
+    ]
+    if not branches:
+        return ""
+    pattern = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+    # A name that ends here already matched; the longer ones are optional
+    return f"(?:{pattern})?" if end else pattern
+
+class ExclusionMatcher:
+    """ Matches descriptions containing any of `names`, anywhere and ignoring case. """
+
+    def __init__(self, names):
+        self.names = normalise_names(names)
+        # One alternation over a trie of the names, so shared prefixes are tried once per position
+        trie = {}
+        for name in self.names:
+            node = trie
+            for char in name:
+                node = node.setdefault(char, {})
+            node[""] = {}
+        self.pattern = re.compile(trie_pattern(trie), re.IGNORECASE) if trie else None
+
+    def matches(self, text: str) -> bool:
+        if not text or self.pattern is None:
+            return False
+        return self.pattern.search(text) is not None
+
+    def mask(self, texts) -> list:
+        return [self.matches(text) for text in texts]
+
+matchers = LRUCache(maxsize=EXCLUSION_CACHE_SIZE)
+
+def get_matcher(names) -> ExclusionMatcher:
+    """ Compiled matcher for a list of names, shared by every user with the same list. """
+    key = normalise_names(names)
+    matcher = matchers.get(key)
+    if matcher is None:
+        matcher = ExclusionMatcher(key)
+        matchers.put(key, matcher)
+    return matcher
+
+def default_matcher() -> ExclusionMatcher:
+    return get_matcher(DEFAULT_EXCLUSIONS)
+
+def load_exclusions(client, user_id: str) -> tuple:
+    """ The user's exclusion list, or the defaults if they have not set one. """
+    response = client.table(EXCLUSION_TABLE).select("names").eq("user_id", user_id).execute()
+    return tuple(response.data[0]["names"]) if response.data else DEFAULT_EXCLUSIONS
+
+def save_exclusions(client, user_id: str, names) -> tuple:
+    names = normalise_names(names)
+    client.table(EXCLUSION_TABLE).upsert({"user_id": user_id, "names": list(names)}, on_conflict="user_id").execute()
+    return names
+
+def user_matcher(client, user_id: str) -> ExclusionMatcher:
+    return get_matcher(load_exclusions(client, user_id))
+
+def user_matchers(client, user_ids: list) -> dict:
+    """ Matchers for many users, loading their lists in one round-trip. """
+    response = client.table(EXCLUSION_TABLE).select("user_id, names").in_("user_id", list(user_ids)).execute()
+    stored = {row["user_id"]: tuple(row["names"]) for row in response.data or []}
+    return {user_id: get_matcher(stored.get(user_id, DEFAULT_EXCLUSIONS)) for user_id in user_ids}
@@ -0,0 +1,143 @@
+from __future__ import annotations
+import json
+import os
+from clients import lazy_import
+
+np = lazy_import("numpy")
+
+ARRAY_NAMES = ("feature", "threshold", "left", "right", "value", "roots")
+
+class CompactForest:
+    """
+    A trained tree ensemble flattened into contiguous node arrays.
+
+    All trees share one set of arrays (feature, threshold, left, right, value);
+    `roots` holds the index of each tree's root node. Leaves point back at
+    themselves, so a batch descends every tree in lock-step, one vectorised
+    step per level, dropping (sample, tree) cursors as they reach a leaf. Prediction is the mean leaf
+    value over the trees, as for a scikit-learn RandomForestRegressor.
+    """
+
+    def __init__(self, feature, threshold, left, right, value, roots, max_depth, feature_names=()):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        self.roots = roots
+        self.max_depth = int(max_depth)
+        self.feature_names = list(feature_names)
+
+    @property
+    def n_trees(self) -> int:
+        return len(self.roots)
+
+    @property
+    def n_nodes(self) -> int:
+        return len(self.feature)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(a.nbytes for a in (self.feature, self.threshold, self.left, self.right, self.value, self.roots))
+
+    @classmethod
+    def from_sklearn(cls, model, feature_names=None):
+        """ Flattens a fitted RandomForestRegressor (single output). """
+        features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+        offset = max_depth = 0
+
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            n = tree.node_count
+            node_ids = np.arange(n)
+            is_leaf = tree.children_left == -1
+
+            roots.append(offset)
+            features.append(np.where(is_leaf, 0, tree.feature))
+            thresholds.append(np.where(is_leaf, 0.0, tree.threshold))
+            lefts.append(np.where(is_leaf, node_ids, tree.children_left) + offset)
+            rights.append(np.where(is_leaf, node_ids, tree.children_right) + offset)
+            values.append(tree.value[:, 0, 0])
+            max_depth = max(max_depth, tree.max_depth)
+            offset += n
+
+        index_dtype = np.int32 if offset < 2 ** 31 else np.int64
+        feature_dtype = np.uint8 if model.n_features_in_ <= 256 else np.int32
+        names = feature_names if feature_names is not None else getattr(model, "feature_names_in_", ())
+        return cls(
+            feature=np.concatenate(features).astype(feature_dtype),
+            threshold=np.concatenate(thresholds).astype(np.float64),
+            left=np.concatenate(lefts).astype(index_dtype),
+            right=np.concatenate(rights).astype(index_dtype),
+            value=np.concatenate(values).astype(np.float64),
+            roots=np.asarray(roots, dtype=index_dtype),
+            max_depth=max_depth,
+            feature_names=[str(n) for n in names]
+        )
+
+    def save(self, path):
+        """
+        Writes a directory of raw .npy arrays plus meta.json, which `load` can
+        memory-map. A path ending in .npz writes the single-file archive instead.
+        """
+        path = str(path)
+        if path.endswith(".npz"):
+            np.savez(
+                path,
+                feature=self.feature, threshold=self.threshold, left=self.left, right=self.right,
+                value=self.value, roots=self.roots, max_depth=np.int64(self.max_depth),
+                feature_names=np.asarray(self.feature_names, dtype=str)
+            )
+            return
+
+        os.makedirs(path, exist_ok=True)
+        for name in ARRAY_NAMES:
+            np.save(os.path.join(path, f"{name}.npy"), np.ascontiguousarray(getattr(self, name)))
+        with open(os.path.join(path, "meta.json"), "w") as f:
+            json.dump({"max_depth": self.max_depth, "feature_names": self.feature_names}, f)
+
+    @classmethod
+    def load(cls, path, mmap: bool = True):
+        """
+        Loads a saved forest. Directory artifacts are memory-mapped read-only by
+        default, so forked workers share the node arrays through the page cache.
+        """
+        path = str(path)
+        if not os.path.isdir(path):
+            with np.load(path) as data:
+                return cls(
+                    feature=data["feature"], threshold=data["threshold"], left=data["left"],
+                    right=data["right"], value=data["value"], roots=data["roots"],
+                    max_depth=data["max_depth"], feature_names=data["feature_names"].tolist()
+                )
+
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        mmap_mode = "r" if mmap else None
+        # np.asarray drops the memmap subclass (cheaper indexing) but keeps the mapped buffer
+        arrays = {name: np.asarray(np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mmap_mode)) for name in ARRAY_NAMES}
+        return cls(max_depth=meta["max_depth"], feature_names=meta["feature_names"], **arrays)
+
+    def predict(self, X) -> np.ndarray:
+        """ Predicts a (n_samples, n_features) batch; a 1-D row is treated as one sample. """
+        # Trees split on float32 features, exactly as scikit-learn does
+        X = np.atleast_2d(np.asarray(X, dtype=np.float32)).astype(np.float64)
+        n_samples, n_features = X.shape
+        flat_X = X.ravel()
+
+        # One (sample, tree) cursor per entry; only cursors not yet on a leaf are advanced
+        nodes = np.tile(self.roots, n_samples)
+        offsets = np.repeat(np.arange(n_samples) * n_features, self.n_trees)
+        active = np.arange(nodes.size)
+
+        while active.size:
+            current = nodes[active]
+            go_left = flat_X[offsets[active] + self.feature[current]] <= self.threshold[current]
+            following = np.where(go_left, self.left[current], self.right[current])
+            nodes[active] = following
+            active = active[following != current]
+
+        return self.value[nodes].reshape(n_samples, self.n_trees).mean(axis=1)
+
+    def predict_one(self, row) -> float:
+        return float(self.predict(row)[0])
@@ -0,0 +1,42 @@
+"""
+Gunicorn settings for the unified service (main:app).
+
+    gunicorn -c gunicorn.conf.py main:app
+
+The app is imported once in the master (preload_app), which warms the heavy
+imports, maps the model and builds the clients (see main.warm_up); workers
+are then forked and share those pages copy-on-write. Every setting can be
+overridden from the environment.
+"""
+import gc
+import os
+
+# 1. Listen where the platform (Railway/Render) tells us to
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+
+# 2. One async worker per core by default
+workers = int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = os.getenv("PRELOAD_APP", "1") == "1"
+
+# Each worker has its own PDF extraction pool; split the cores between them
+os.environ.setdefault("PARSER_WORKERS", str(max((os.cpu_count() or 1) // max(workers, 1), 1)))
+
+# 3. Timeouts (LLM calls carry their own deadline, see llm_client.py)
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 60))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", 30))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", 5))
+
+# 4. Recycle workers now and then; replacements fork from the warm master
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", 0))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", 0))
+
+accesslog = "-"
+errorlog = "-"
+loglevel = os.getenv("LOG_LEVEL", "info")
+
+def when_ready(server):
+    # Runs in the master before the first fork: move everything allocated so far
+    # out of the collector's reach, so worker GC passes don't touch (and copy) those pages
+    gc.freeze()
+    server.log.info(f"Master ready, {gc.get_freeze_count()} objects frozen; forking {workers} workers")
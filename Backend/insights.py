@@ -1,12 +1,16 @@
-import numpy as np
 import random
-from google import genai
-import os
 from dotenv import load_dotenv
-from datetime import datetime
+from analytics import TransactionFrame
+from exclusions import default_matcher
+from llm_client import LLM_MODEL, get_genai_client, get_insight_client
+from user_summary import summary_months
+from metrics import counter, span
 
 load_dotenv()
 
+# Counted whenever the templates stand in for the model
+llm_fallbacks_total = counter("llm_fallbacks_total", "Insights served from the hardcoded templates instead of the model.")
+
 # Predefined templates for hardcoded fallback
 INSIGHT_TEMPLATES = {
     "high_savings": [
@@ -25,38 +29,23 @@ INSIGHT_TEMPLATES = {
     ]
 }
 
-def generate_gemini_insights(monthly_income, transactions, emi, interest_rate, job_title, education):
-    """Refined AI logic with correct model version and 3-month normalization"""
-    try:
-        client = genai.Client(api_key=os.getenv('GEMINI_API_KEY'))
-        
-        # --- STEP 1: BLACKLIST FILTERING ---
-        blacklist = ["Aakansha Lallan Gupta", "Cash", "Self", "Transfer", "BANARSHI"]
-        filtered_tx = [
-            tx for tx in transactions 
-            if not any(name.lower() in tx.get('description', '').lower() for name in blacklist)
-        ]
-        
-        # --- STEP 2: PERIOD NORMALIZATION ---
-        dates = [datetime.strptime(tx['date'], '%Y-%m-%d') for tx in transactions if tx.get('date')]
-        if len(dates) > 1:
-            days_diff = (max(dates) - min(dates)).days
-            num_months = max(1, round(days_diff / 30.44, 1))
-        else:
-            num_months = 1
-
-        total_filtered_spent = sum(abs(float(tx['amount'])) for tx in filtered_tx if float(tx['amount']) < 0)
-        avg_monthly_expense = total_filtered_spent / num_months
-        
-        savings_amt = monthly_income - avg_monthly_expense
-        savings_rate = round((savings_amt / monthly_income * 100), 1) if monthly_income > 0 else 0
-        
-        # Identify Top Monthly Merchants
-        expenses_list = [tx for tx in filtered_tx if float(tx['amount']) < 0]
-        top_tx = sorted(expenses_list, key=lambda x: abs(float(x['amount'])), reverse=True)[:5]
-        
-        # --- STEP 3: CAREER-AWARE PROMPT ---
-        prompt = f"""
+def build_gemini_prompt(monthly_income, emi, interest_rate, job_title, education, frame, exclusions=None, user_id=None):
+    """ Returns the Gemini prompt and the normalised cache key of its inputs (scoped to `user_id`). """
+    # --- STEP 1: EXCLUSION FILTERING (the user's list, see exclusions.py) ---
+    excluded = frame.exclusion_mask(exclusions or default_matcher())
+    
+    # --- STEP 2: PERIOD NORMALIZATION ---
+    figures = frame.savings(monthly_income, exclude=excluded)
+    num_months = figures["num_months"]
+    avg_monthly_expense = figures["avg_monthly_expense"]
+    savings_amt = figures["savings_amt"]
+    savings_rate = figures["savings_rate"]
+    
+    # Identify Top Monthly Merchants (expense grouped by merchant id, see merchants.py)
+    top_merchants = frame.top_merchants(5, exclude=excluded)
+    
+    # --- STEP 3: CAREER-AWARE PROMPT ---
+    prompt = f"""
         Act as 'Grok', a witty financial advisor for a {education} level student/professional working as a {job_title}. 
         
         Monthly Financial Context (Normalized from a {num_months} month period):
@@ -66,7 +55,7 @@ def generate_gemini_insights(monthly_income, transactions, emi, interest_rate, j
         - Debt: EMI of ₹{emi:,.0f} at {interest_rate}% interest.
         
         Top Spends (Normalized per month):
-        {chr(10).join([f"- {tx['description']}: ₹{abs(float(tx['amount'])) / num_months:,.0f}/mo" for tx in top_tx])}
+        {chr(10).join([f"- {name}: ₹{total / num_months:,.0f}/mo" for name, total in top_merchants])}
         
         RULES:
         1. NEVER mention personal names like 'Aakansha'.
@@ -74,37 +63,65 @@ def generate_gemini_insights(monthly_income, transactions, emi, interest_rate, j
         3. Reference their role as a {job_title}.
         4. Focus on the ₹{savings_amt:,.0f} monthly surplus or deficit.
         """
+
+    # Income and EMI to the nearest ₹1,000 and the savings rate to the point, so
+    # dashboard refreshes with unchanged finances share one model response. The prompt
+    # carries the user's own merchants and figures, so responses are never shared across users
+    cache_key = (
+        user_id, job_title, education, round(monthly_income, -3), round(emi, -3), interest_rate,
+        round(savings_rate), tuple(name for name, _ in top_merchants)
+    )
+    return prompt, cache_key
+
+def parse_gemini_suggestions(text):
+    suggestions = [line.strip().replace('* ', '').replace('- ', '') for line in text.split('\n') if line.strip()]
+    return [s for s in suggestions if '₹' in s or any(e in s for e in ['💎', '🚀', '🦁', '⚠️', '📉'])][:3]
+
+def generate_gemini_insights(monthly_income, transactions, emi, interest_rate, job_title, education, frame=None, exclusions=None):
+    """Refined AI logic with correct model version and 3-month normalization"""
+    try:
+        frame = frame or TransactionFrame(transactions)
+        with span("insights.prompt"):
+            prompt, _ = build_gemini_prompt(monthly_income, emi, interest_rate, job_title, education, frame, exclusions)
         
         # USE THE CORRECT MODEL VERSION: gemini-2.0-flash
-        response = client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=prompt
-        )
-        
-        suggestions = [line.strip().replace('* ', '').replace('- ', '') for line in response.text.split('\n') if line.strip()]
-        return [s for s in suggestions if '₹' in s or any(e in s for e in ['💎', '🚀', '🦁', '⚠️', '📉'])][:3]
+        with span("insights.llm"):
+            response = get_genai_client().models.generate_content(
+                model=LLM_MODEL,
+                contents=prompt
+            )
+        return parse_gemini_suggestions(response.text)
         
     except Exception as e:
         print(f"AI Model Error: {e}")
         return None
 
-def generate_hardcoded_insights(monthly_income, transactions, emi, interest_rate):
+async def generate_gemini_insights_async(monthly_income, transactions, emi, interest_rate, job_title, education, frame=None, client=None, exclusions=None, user_id=None):
+    """ Same insights through the shared async client: cached, rate-limited and time-bounded. """
+    try:
+        frame = frame or TransactionFrame(transactions)
+        with span("insights.prompt"):
+            prompt, cache_key = build_gemini_prompt(monthly_income, emi, interest_rate, job_title, education, frame, exclusions, user_id)
+        with span("insights.llm"):
+            text = await (client or get_insight_client()).generate(prompt, cache_key=cache_key)
+        return parse_gemini_suggestions(text) if text else None
+    except Exception as e:
+        print(f"AI Model Error: {e}")
+        return None
+
+def generate_hardcoded_insights(monthly_income, transactions, emi, interest_rate, frame=None, exclusions=None):
     """ Fallback logic if AI fails """
-    blacklist = ["Aakansha Lallan Gupta", "BANARSHI"]
-    filtered_tx = [tx for tx in transactions if not any(n.lower() in tx.get('description', '').lower() for n in blacklist)]
+    frame = frame or TransactionFrame(transactions)
+    excluded = frame.exclusion_mask(exclusions or default_matcher())
     
-    dates = [datetime.strptime(tx['date'], '%Y-%m-%d') for tx in transactions if tx.get('date')]
-    num_months = max(1, round((max(dates) - min(dates)).days / 30.44, 1)) if len(dates) > 1 else 1
-    
-    total_spent = sum(abs(float(tx['amount'])) for tx in filtered_tx if float(tx['amount']) < 0)
-    avg_monthly_spent = total_spent / num_months
-    
-    savings_amt = monthly_income - avg_monthly_spent
-    savings_rate = round((savings_amt / monthly_income * 100), 1) if monthly_income > 0 else 0
+    figures = frame.savings(monthly_income, exclude=excluded)
+    num_months = figures["num_months"]
+    savings_amt = figures["savings_amt"]
+    savings_rate = figures["savings_rate"]
 
-    top_tx_list = [tx for tx in filtered_tx if float(tx['amount']) < 0]
-    top_tx = sorted(top_tx_list, key=lambda x: abs(float(x['amount'])), reverse=True)[0] if top_tx_list else None
-    top_amt_mo = (abs(float(top_tx['amount'])) / num_months) if top_tx else 0
+    top = frame.top_merchants(1, exclude=excluded)
+    top_merchant, top_total = top[0] if top else ("Retail", 0)
+    top_amt_mo = top_total / num_months
 
     suggestions = []
     if savings_rate >= 20:
@@ -112,7 +129,7 @@ def generate_hardcoded_insights(monthly_income, transactions, emi, interest_rate
         suggestions.append(tpl.format(rate=savings_rate, surplus=f"{savings_amt:,.0f}"))
     else:
         tpl = random.choice(INSIGHT_TEMPLATES["low_savings"])
-        suggestions.append(tpl.format(rate=savings_rate, top_merchant=top_tx['description'] if top_tx else "Retail", top_amt=f"{top_amt_mo:,.0f}", potential=f"{(top_amt_mo * 0.2):,.0f}"))
+        suggestions.append(tpl.format(rate=savings_rate, top_merchant=top_merchant, top_amt=f"{top_amt_mo:,.0f}", potential=f"{(top_amt_mo * 0.2):,.0f}"))
 
     if emi > 0:
         emi_ratio = round((emi / monthly_income * 100), 1)
@@ -121,41 +138,32 @@ def generate_hardcoded_insights(monthly_income, transactions, emi, interest_rate
 
     return suggestions[:3]
 
-def generate_spending_insights(profile_data, transactions):
-    """ Main entry point """
-    income = float(profile_data.get('monthly_income', 0))
-    emi = float(profile_data.get('monthly_emi', 0))
-    interest = float(profile_data.get('interest_rate', 0))
-    job = profile_data.get('job_title', 'Student')
-    edu = profile_data.get('education_level', "Bachelor's")
+def profile_inputs(profile_data):
+    return (
+        float(profile_data.get('monthly_income', 0)),
+        float(profile_data.get('monthly_emi', 0)),
+        float(profile_data.get('interest_rate', 0)),
+        profile_data.get('job_title', 'Student'),
+        profile_data.get('education_level', "Bachelor's")
+    )
 
-    try:
-        suggestions = generate_gemini_insights(income, transactions, emi, interest, job, edu)
-        if not suggestions: raise ValueError("AI Returned No Suggestions")
-    except Exception as e:
-        print(f"⚠️ Falling back: {e}")
-        suggestions = generate_hardcoded_insights(income, transactions, emi, interest)
+def finish_insights(suggestions, income, frame, summary=None, exclusions=None):
+    """ Adds anomaly alerts and the all-time savings rate to the chosen suggestions. """
+    exclusions = exclusions or default_matcher()
 
-    # Anomaly Detection (Z-Score)
-    alerts = []
-    expenses_list = [tx for tx in transactions if float(tx['amount']) < 0 and "Aakansha" not in tx.get('description', '')]
-    amounts = [abs(float(tx['amount'])) for tx in expenses_list]
-    
-    if len(amounts) > 3:
-        mean_val, std_val = np.mean(amounts), np.std(amounts)
-        for tx in expenses_list:
-            val = abs(float(tx['amount']))
-            if val > (mean_val + 2 * std_val) and val > 1000:
-                alerts.append({
-                    "date": tx['date'],
-                    "description": tx['description'],
-                    "reason": f"Spending is {round((val-mean_val)/std_val, 1)}x higher than typical."
-                })
-
-    # Recalculate Savings Rate for Final Return
-    dates = [datetime.strptime(tx['date'], '%Y-%m-%d') for tx in transactions if tx.get('date')]
-    num_months = max(1, round((max(dates) - min(dates)).days / 30.44, 1)) if len(dates) > 1 else 1
-    total_spent = sum(abs(float(tx['amount'])) for tx in transactions if float(tx['amount']) < 0)
+    # Anomaly Detection (Z-Score): per-category alerts scored at ingest, when the summary has them
+    if summary and summary.get("baselines") is not None:
+        alerts = [a for a in summary.get("alerts", []) if not exclusions.matches(a["description"])]
+    else:
+        alerts = frame.anomalies(exclude=frame.exclusion_mask(exclusions))
+
+    # Recalculate Savings Rate for Final Return (excluded payees are not spending)
+    if summary:
+        num_months = summary_months(summary)
+        total_spent = summary["total_expense"] - summary.get("excluded_expense", 0.0)
+    else:
+        num_months = frame.num_months()
+        total_spent = frame.expense_total(exclude=frame.exclusion_mask(exclusions))
     savings_rate = round(((income - (total_spent / num_months)) / income * 100), 1) if income > 0 else 0
 
     return {
@@ -163,3 +171,45 @@ def generate_spending_insights(profile_data, transactions):
         "alerts": alerts,
         "savings_rate": savings_rate
     }
+
+def generate_spending_insights(profile_data, transactions, summary=None, frame=None, exclusions=None):
+    """ Main entry point. `summary` (see user_summary.py) supplies the all-time totals when given. """
+    income, emi, interest, job, edu = profile_inputs(profile_data)
+
+    # One conversion to columns, shared by every figure below
+    frame = frame or TransactionFrame(transactions)
+
+    try:
+        suggestions = generate_gemini_insights(income, transactions, emi, interest, job, edu, frame=frame, exclusions=exclusions)
+        if not suggestions: raise ValueError("AI Returned No Suggestions")
+    except Exception as e:
+        print(f"⚠️ Falling back: {e}")
+        llm_fallbacks_total.inc()
+        suggestions = generate_hardcoded_insights(income, transactions, emi, interest, frame=frame, exclusions=exclusions)
+
+    with span("insights.finish"):
+        return finish_insights(suggestions, income, frame, summary, exclusions)
+
+def generate_template_insights(profile_data, transactions, summary=None, frame=None, exclusions=None):
+    """ Insights from the hardcoded templates only, for batch jobs that skip the model call. """
+    income, emi, interest, _, _ = profile_inputs(profile_data)
+    frame = frame or TransactionFrame(transactions)
+    suggestions = generate_hardcoded_insights(income, transactions, emi, interest, frame=frame, exclusions=exclusions)
+    return finish_insights(suggestions, income, frame, summary, exclusions)
+
+async def generate_spending_insights_async(profile_data, transactions, summary=None, frame=None, client=None, exclusions=None):
+    """ Async entry point for request handlers; never waits on the model past its deadline. """
+    income, emi, interest, job, edu = profile_inputs(profile_data)
+    frame = frame or TransactionFrame(transactions)
+
+    suggestions = await generate_gemini_insights_async(
+        income, transactions, emi, interest, job, edu, frame=frame, client=client, exclusions=exclusions,
+        user_id=profile_data.get('user_id')
+    )
+    if not suggestions:
+        print("⚠️ Falling back: AI Returned No Suggestions")
+        llm_fallbacks_total.inc()
+        suggestions = generate_hardcoded_insights(income, transactions, emi, interest, frame=frame, exclusions=exclusions)
+
+    with span("insights.finish"):
+        return finish_insights(suggestions, income, frame, summary, exclusions)
@@ -0,0 +1,223 @@
+"""
+Local background jobs for slow endpoints.
+
+`/predict` and `/upload` accept `background=true`: the request is queued on
+this process's worker pool and answered at once with a job id. The result is
+then available from
+
+    GET /jobs/{job_id}          current snapshot (status, result so far)
+    GET /jobs/{job_id}/events   server-sent events, one per stage
+
+A job publishes its stages as they finish, so a prediction streams the
+deterministic numbers before the AI suggestions. Snapshots are also stored
+through the repository (the `jobs` table, see supabase/migrations), so a poll
+that lands on another gunicorn worker still finds the job. JOB_PERSIST turns
+this off; it defaults to on for a database backend and off for DB_BACKEND=memory,
+whose state is per worker anyway. A full queue is answered with a 429 and Retry-After.
+"""
+import os
+import json
+import uuid
+import asyncio
+from datetime import datetime
+from fastapi import APIRouter, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from cache import LRUCache
+from repository import DB_BACKEND, get_repository
+
+# Worker pool, queue bound and retention of finished jobs
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 8))
+JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", 256))
+JOB_RETENTION = int(os.getenv("JOB_RETENTION", 1024))
+JOB_TTL_SECONDS = float(os.getenv("JOB_TTL_SECONDS", 3600))
+JOB_PERSIST = os.getenv("JOB_PERSIST", "0" if DB_BACKEND == "memory" else "1") == "1"
+JOB_HEARTBEAT_SECONDS = float(os.getenv("JOB_HEARTBEAT_SECONDS", 15))
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", 1.0))
+JOB_RETRY_AFTER_SECONDS = int(os.getenv("JOB_RETRY_AFTER_SECONDS", 5))
+
+TERMINAL_STATES = ("done", "error")
+
+class QueueFullError(Exception):
+    pass
+
+class Job:
+    """ One queued unit of work and the events it has published so far. """
+
+    def __init__(self, kind: str, store=None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.status = "queued"
+        self.result = {}
+        self.error = None
+        self.events = []
+        self.created_at = self.updated_at = datetime.now().isoformat()
+        self.changed = asyncio.Event()
+        self.store = store
+
+    async def publish(self, event: str, data: dict = None, status: str = None):
+        """ Records a stage, merges its data into the result and wakes every listener. """
+        data = data or {}
+        self.events.append({"event": event, "data": data})
+        self.result.update(data)
+        self.status = status or self.status
+        self.updated_at = datetime.now().isoformat()
+
+        # Swap in a fresh Event so later waits block until the next publish
+        changed, self.changed = self.changed, asyncio.Event()
+        changed.set()
+
+        if self.store:
+            try:
+                await self.store(self.snapshot())
+            except Exception as e:
+                print(f"Job store failed for {self.id}: {e}")
+
+    def snapshot(self) -> dict:
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "result": self.result,
+            "error": self.error,
+            "events": self.events,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at
+        }
+
+async def store_job(snapshot: dict):
+    await get_repository().save_job(snapshot)
+
+class JobQueue:
+    """
+    A bounded queue drained by `workers` asyncio tasks on the running loop.
+    Handlers are `async handler(job) -> dict`; the returned dict becomes the
+    final 'done' event, and an exception becomes the 'error' event.
+    """
+
+    def __init__(self, workers: int = JOB_WORKERS, max_queued: int = JOB_QUEUE_SIZE,
+                 retention: int = JOB_RETENTION, ttl: float = JOB_TTL_SECONDS, store=None):
+        self.worker_count = max(workers, 1)
+        self.max_queued = max_queued
+        self.jobs = LRUCache(maxsize=retention, ttl=ttl)
+        self.store = store
+        self.queue = None
+        self.workers = []
+
+    def _ensure_started(self):
+        # Started on first submit, inside the serving process (never in a pre-fork master)
+        if self.queue is None:
+            self.queue = asyncio.Queue(maxsize=self.max_queued)
+            self.workers = [asyncio.create_task(self._work()) for _ in range(self.worker_count)]
+
+    def submit(self, kind: str, handler) -> Job:
+        self._ensure_started()
+        job = Job(kind, store=self.store)
+        try:
+            self.queue.put_nowait((job, handler))
+        except asyncio.QueueFull:
+            raise QueueFullError(f"Job queue is full ({self.max_queued} waiting), try again shortly")
+        self.jobs.put(job.id, job)
+        return job
+
+    def get(self, job_id: str):
+        return self.jobs.get(job_id)
+
+    async def _work(self):
+        while True:
+            job, handler = await self.queue.get()
+            try:
+                await job.publish("started", status="running")
+                result = await handler(job)
+                await job.publish("done", result, status="done")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                job.error = str(e)
+                await job.publish("error", {"message": str(e)}, status="error")
+            finally:
+                self.queue.task_done()
+
+    async def stop(self):
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.queue, self.workers = None, []
+
+job_queue = JobQueue(store=store_job if JOB_PERSIST else None)
+
+def queue_full_response(error: QueueFullError) -> JSONResponse:
+    """ 429 with Retry-After, as the upload admission gate answers when it is full. """
+    return JSONResponse(
+        {"status": "error", "message": str(error)}, status_code=429,
+        headers={"Retry-After": str(JOB_RETRY_AFTER_SECONDS)}
+    )
+
+def queued_response(job: Job) -> dict:
+    return {
+        "status": "queued",
+        "job_id": job.id,
+        "status_url": f"/jobs/{job.id}",
+        "events_url": f"/jobs/{job.id}/events"
+    }
+
+async def find_job(job_id: str):
+    """ Snapshot of a job from this process, or from the store if another worker owns it. """
+    job = job_queue.get(job_id)
+    if job is not None:
+        return job.snapshot()
+    if JOB_PERSIST:
+        return await get_repository().load_job(job_id)
+    return None
+
+def format_event(index: int, event: dict) -> str:
+    return f"id: {index}\nevent: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+
+async def iter_job_events(job_id: str, seen: int = 0):
+    """ Yields a job's events as SSE frames from index `seen` until it finishes. """
+    while True:
+        job = job_queue.get(job_id)
+        if job is not None:
+            events, status, changed = job.events, job.status, job.changed
+        else:
+            snapshot = await find_job(job_id)
+            if snapshot is None:
+                yield format_event(seen, {"event": "error", "data": {"message": "Unknown job"}})
+                return
+            events, status, changed = snapshot["events"], snapshot["status"], None
+
+        for index in range(seen, len(events)):
+            yield format_event(index, events[index])
+        seen = len(events)
+        if status in TERMINAL_STATES:
+            return
+
+        if changed is None:
+            # Owned by another worker: follow the stored snapshot
+            await asyncio.sleep(JOB_POLL_SECONDS)
+            continue
+        try:
+            await asyncio.wait_for(changed.wait(), timeout=JOB_HEARTBEAT_SECONDS)
+        except asyncio.TimeoutError:
+            # Comment frame keeps proxies from closing an idle stream
+            yield ": keep-alive\n\n"
+
+router = APIRouter()
+router.add_event_handler("shutdown", job_queue.stop)
+
+@router.get("/jobs/{job_id}")
+async def job_status(job_id: str):
+    snapshot = await find_job(job_id)
+    if snapshot is None:
+        return {"status": "error", "message": "Unknown or expired job"}
+    return snapshot
+
+@router.get("/jobs/{job_id}/events")
+async def job_events(job_id: str, request: Request):
+    # A reconnecting EventSource resumes after the last event it received
+    last_event_id = request.headers.get("last-event-id")
+    seen = int(last_event_id) + 1 if last_event_id and last_event_id.isdigit() else 0
+    return StreamingResponse(
+        iter_job_events(job_id, seen),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
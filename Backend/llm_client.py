@@ -0,0 +1,121 @@
+import os
+import asyncio
+from cache import LRUCache
+from metrics import counter
+
+# Deadline, concurrency and cache settings for model calls
+LLM_MODEL = os.getenv("LLM_MODEL", "gemini-2.5-flash")
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", 4.0))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 8))
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", 512))
+LLM_CACHE_TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL_SECONDS", 900))
+
+# Outcome of every generate(): cache_hit, shared (joined an identical in-flight call), ok, empty, timeout, error
+llm_requests_total = counter("llm_requests_total", "Insight model requests by outcome.", ("outcome",))
+
+genai_client = None
+
+def get_genai_client():
+    """ Process-wide genai.Client, created on first use instead of once per request. """
+    global genai_client
+    if genai_client is None:
+        from google import genai
+        genai_client = genai.Client(api_key=os.getenv('GEMINI_API_KEY'))
+    return genai_client
+
+class GeminiBackend:
+    def __init__(self, model: str = LLM_MODEL):
+        self.model = model
+
+    @property
+    def client(self):
+        return get_genai_client()
+
+    async def generate(self, prompt: str) -> str:
+        response = await self.client.aio.models.generate_content(model=self.model, contents=prompt)
+        return response.text
+
+class FakeBackend:
+    """ Local stand-in for tests and benchmarks: canned text after an optional delay. """
+
+    def __init__(self, text: str = "💎 Fake insight about ₹0", delay: float = 0.0, error: Exception = None):
+        self.text = text
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+
+    async def generate(self, prompt: str) -> str:
+        self.calls += 1
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return self.text
+
+class InsightClient:
+    """
+    Async model client with a hard deadline, a concurrency limit and a TTL/LRU
+    response cache. Concurrent requests for the same key share one model call.
+    Returns None when the deadline passes or the backend fails, so callers can
+    fall back to the hardcoded insights.
+    """
+
+    def __init__(self, backend=None, timeout: float = LLM_TIMEOUT_SECONDS,
+                 max_concurrency: int = LLM_MAX_CONCURRENCY, cache: LRUCache = None):
+        self.backend = backend or GeminiBackend()
+        self.timeout = timeout
+        self.semaphore = asyncio.Semaphore(max(max_concurrency, 1))
+        self.cache = cache or LRUCache(maxsize=LLM_CACHE_SIZE, ttl=LLM_CACHE_TTL_SECONDS)
+        self.in_flight = {}
+
+    async def _call(self, prompt: str) -> str:
+        async with self.semaphore:
+            return await self.backend.generate(prompt)
+
+    async def generate(self, prompt: str, cache_key=None):
+        if cache_key is not None:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                llm_requests_total.inc(outcome="cache_hit")
+                return cached
+            pending = self.in_flight.get(cache_key)
+            if pending is not None:
+                llm_requests_total.inc(outcome="shared")
+                return await asyncio.shield(pending)
+
+        task = asyncio.ensure_future(self._generate(prompt, cache_key))
+        if cache_key is not None:
+            self.in_flight[cache_key] = task
+            task.add_done_callback(lambda _: self.in_flight.pop(cache_key, None))
+        return await asyncio.shield(task)
+
+    async def _generate(self, prompt: str, cache_key):
+        try:
+            # The deadline covers waiting for a slot as well as the model call itself
+            text = await asyncio.wait_for(self._call(prompt), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            print(f"AI Model Timeout: no response within {self.timeout}s")
+            llm_requests_total.inc(outcome="timeout")
+            return None
+        except Exception as e:
+            print(f"AI Model Error: {e}")
+            llm_requests_total.inc(outcome="error")
+            return None
+
+        llm_requests_total.inc(outcome="ok" if text else "empty")
+        if text and cache_key is not None:
+            self.cache.put(cache_key, text)
+        return text
+
+insight_client = None
+
+def get_insight_client() -> InsightClient:
+    global insight_client
+    if insight_client is None:
+        insight_client = InsightClient()
+    return insight_client
+
+def set_insight_client(client: InsightClient):
+    """ Swaps the process-wide client, e.g. for InsightClient(FakeBackend()) in tests. """
+    global insight_client
+    insight_client = client
@@ -1,14 +1,25 @@
 import os
 import uvicorn
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 
-# Import your spending logic (which includes insights.py internally)
-import spending 
+# Import the upload and spending logic (spending includes insights.py internally)
+import Parser
+import spending
+import jobs
+from clients import preload
+from repository import close_repository, get_repository
+from llm_client import get_genai_client
+from admission import UploadAdmissionMiddleware, upload_gate
+from metrics import MetricsMiddleware, gauge, render
 
 app = FastAPI(title="Finance.AI Dashboard & Insights")
 
-# Enable CORS 
+# Upload admission control, inside CORS so rejections are readable by the browser
+app.add_middleware(UploadAdmissionMiddleware)
+
+# Enable CORS
 app.add_middleware(
     CORSMiddleware,
     # Keep your specific origins for security
@@ -19,17 +30,56 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Lets the dashboard read the per-stage breakdown of a profiled request
+    expose_headers=["Server-Timing"],
 )
 
-# Include only the spending router
-# This handles /predict and calls generate_spending_insights internally
+# Outermost, so request latency covers admission and CORS; see metrics.py for X-Profile
+app.add_middleware(MetricsMiddleware)
+
+# Include the upload router (/upload), the spending router (/predict, /predict/batch)
+# and the background job routes (/jobs/{job_id}, /jobs/{job_id}/events)
+app.include_router(Parser.router)
 app.include_router(spending.router)
+app.include_router(jobs.router)
+
+def warm_up():
+    """
+    Does the one-off initialisation up front: heavy imports, the memory-mapped
+    model and the API clients. Under gunicorn with preload_app this runs once
+    in the master, and forked workers share the result copy-on-write. No
+    connection is opened here, so nothing socket-bound crosses the fork.
+    """
+    preload("numpy", "pdfplumber")
+    spending.get_model()
+    get_repository()
+    if os.getenv("GEMINI_API_KEY"):
+        get_genai_client()
+
+app.add_event_handler("shutdown", close_repository)
+
+# Skipped for local tools that only import the app (set WARM_UP=0)
+if os.getenv("WARM_UP", "1") == "1":
+    warm_up()
+
+# Point-in-time values read on each scrape
+gauge("uploads_active", "Uploads holding an admission slot.", lambda: upload_gate.stats()["active"])
+gauge("uploads_waiting", "Uploads waiting for an admission slot.", lambda: upload_gate.stats()["waiting"])
+gauge("jobs_queued", "Background jobs waiting for a worker.", lambda: jobs.job_queue.queue.qsize() if jobs.job_queue.queue else 0)
+gauge("model_loaded", "1 when the spending model is loaded.", lambda: spending.model is not None)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """ Prometheus text exposition of this worker's counters and latency histograms. """
+    return PlainTextResponse(render(), media_type="text/plain; version=0.0.4")
 
 @app.get("/")
 def health_check():
     return {
         "status": "Finance.AI Dashboard Online",
-        "services": ["Spending ML", "Gemini Insights"]
+        "services": ["Statement Parser", "Spending ML", "Gemini Insights"],
+        "model_loaded": spending.get_model() is not None,
+        "model_version": spending.model_version()
     }
 
 if __name__ == "__main__":
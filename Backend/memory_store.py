@@ -0,0 +1,235 @@
+"""
+In-memory stand-in for the subset of the Supabase client the services use.
+
+    client = InMemoryClient()
+    client.table("transactions").insert(rows).execute()
+    client.table("transactions").select("*").eq("user_id", uid).execute().data
+
+Failures can be injected to exercise retry paths: `max_rows_per_request`
+mimics the server payload limit and `fail_next` makes the next N writes
+raise a transient error.
+"""
+import copy
+import itertools
+import re
+from dataclasses import dataclass
+from threading import Lock
+
+@dataclass
+class APIResponse:
+    data: list
+    count: int = None
+
+class TransientError(Exception):
+    # Raised before anything is written, so a retry cannot duplicate rows
+    pre_commit = True
+
+def _coerce(value: str, like):
+    if isinstance(like, bool):
+        return value.lower() == "true"
+    if isinstance(like, int):
+        return int(value)
+    if isinstance(like, float):
+        return float(value)
+    return value
+
+COMPARATORS = {
+    "eq": lambda a, b: a == b,
+    "neq": lambda a, b: a != b,
+    "gt": lambda a, b: a > b,
+    "gte": lambda a, b: a >= b,
+    "lt": lambda a, b: a < b,
+    "lte": lambda a, b: a <= b,
+}
+
+def _split_top_level(expr: str) -> list:
+    parts, depth, current = [], 0, ""
+    for ch in expr:
+        if ch == "," and depth == 0:
+            parts.append(current)
+            current = ""
+            continue
+        depth += (ch == "(") - (ch == ")")
+        current += ch
+    if current:
+        parts.append(current)
+    return parts
+
+def parse_logic_filter(expr: str, combine=any):
+    """ Compiles a PostgREST logic filter such as 'date.gt.X,and(date.eq.X,id.gt.5)'. """
+    predicates = []
+    for part in _split_top_level(expr):
+        nested = re.match(r'^(and|or)\((.*)\)$', part.strip())
+        if nested:
+            predicates.append(parse_logic_filter(nested.group(2), all if nested.group(1) == "and" else any))
+            continue
+        column, op, value = part.strip().split(".", 2)
+        compare = COMPARATORS[op]
+        predicates.append(
+            lambda row, c=column, cmp=compare, v=value: row.get(c) is not None and cmp(row.get(c), _coerce(v, row.get(c)))
+        )
+    return lambda row: combine(p(row) for p in predicates)
+
+class InMemoryQuery:
+    def __init__(self, client, table_name: str):
+        self.client = client
+        self.table_name = table_name
+        self.columns = None
+        self.filters = []
+        self.action = "select"
+        self.payload = None
+        self.on_conflict = None
+        self.ignore_duplicates = False
+        self.orders = []
+        self.row_limit = None
+
+    # --- builders ---
+    def select(self, columns: str = "*"):
+        self.action = "select"
+        self.columns = None if columns.strip() == "*" else [c.strip() for c in columns.split(",")]
+        return self
+
+    def insert(self, rows):
+        self.action, self.payload = "insert", rows
+        return self
+
+    def upsert(self, rows, on_conflict: str = None, ignore_duplicates: bool = False):
+        self.action, self.payload, self.on_conflict = "upsert", rows, on_conflict
+        self.ignore_duplicates = ignore_duplicates
+        return self
+
+    def update(self, values: dict):
+        self.action, self.payload = "update", values
+        return self
+
+    def eq(self, column, value):
+        self.filters.append(lambda row: row.get(column) == value)
+        return self
+
+    def is_(self, column, value):
+        # Only the NULL test is used (`is_(column, "null")`)
+        self.filters.append(lambda row: row.get(column) is None)
+        return self
+
+    def gt(self, column, value):
+        self.filters.append(lambda row: row.get(column) is not None and row.get(column) > value)
+        return self
+
+    def lt(self, column, value):
+        self.filters.append(lambda row: row.get(column) is not None and row.get(column) < value)
+        return self
+
+    def gte(self, column, value):
+        self.filters.append(lambda row: row.get(column) is not None and row.get(column) >= value)
+        return self
+
+    def lte(self, column, value):
+        self.filters.append(lambda row: row.get(column) is not None and row.get(column) <= value)
+        return self
+
+    def in_(self, column, values):
+        allowed = set(values)
+        self.filters.append(lambda row: row.get(column) in allowed)
+        return self
+
+    def or_(self, filters: str):
+        self.filters.append(parse_logic_filter(filters))
+        return self
+
+    def order(self, column: str, desc: bool = False):
+        self.orders.append((column, desc))
+        return self
+
+    def limit(self, size: int):
+        self.row_limit = size
+        return self
+
+    # --- execution ---
+    def execute(self) -> APIResponse:
+        if self.action == "select":
+            return APIResponse(self.client._select(self))
+        if self.action == "update":
+            return APIResponse(self.client._update(self))
+        rows = self.payload if isinstance(self.payload, list) else [self.payload]
+        return APIResponse(self.client._write(self.table_name, rows, self.action, self.on_conflict, self.ignore_duplicates))
+
+class InMemoryClient:
+    def __init__(self, max_rows_per_request: int = None):
+        self.tables = {}
+        self.max_rows_per_request = max_rows_per_request
+        self.fail_next = 0
+        self.requests = 0
+        self._ids = itertools.count(1)
+        self._lock = Lock()
+        # (table, conflict columns) -> {key values: row}, built on the first upsert on those columns
+        self._indexes = {}
+
+    def table(self, table_name: str) -> InMemoryQuery:
+        return InMemoryQuery(self, table_name)
+
+    def _select(self, query: InMemoryQuery) -> list:
+        with self._lock:
+            self.requests += 1
+            rows = [row for row in self.tables.get(query.table_name, []) if all(f(row) for f in query.filters)]
+        for column, desc in reversed(query.orders):
+            rows = sorted(rows, key=lambda row: row.get(column), reverse=desc)
+        if query.row_limit is not None:
+            rows = rows[:query.row_limit]
+        if query.columns:
+            return [{c: row.get(c) for c in query.columns} for row in rows]
+        return copy.deepcopy(rows)
+
+    def _update(self, query: InMemoryQuery) -> list:
+        """ Applies the query's values to its matching rows; returns them as updated. """
+        with self._lock:
+            self.requests += 1
+            if self.fail_next > 0:
+                self.fail_next -= 1
+                raise TransientError("injected transient failure")
+            rows = [row for row in self.tables.get(query.table_name, []) if all(f(row) for f in query.filters)]
+            for row in rows:
+                row.update(copy.deepcopy(query.payload))
+            return [dict(row) for row in rows]
+
+    def _index(self, table_name: str, keys: tuple) -> dict:
+        index = self._indexes.get((table_name, keys))
+        if index is None:
+            index = self._indexes[(table_name, keys)] = {}
+            for row in self.tables.get(table_name, []):
+                values = tuple(row.get(k) for k in keys)
+                if None not in values:
+                    index.setdefault(values, row)
+        return index
+
+    def _write(self, table_name: str, rows: list, action: str, on_conflict: str, ignore_duplicates: bool = False) -> list:
+        with self._lock:
+            self.requests += 1
+            if self.fail_next > 0:
+                self.fail_next -= 1
+                raise TransientError("injected transient failure")
+            if self.max_rows_per_request and len(rows) > self.max_rows_per_request:
+                raise TransientError(f"payload too large: {len(rows)} rows")
+
+            table = self.tables.setdefault(table_name, [])
+            keys = tuple(k.strip() for k in on_conflict.split(",")) if action == "upsert" and on_conflict else None
+            index = self._index(table_name, keys) if keys else None
+            written = []
+            for row in rows:
+                row = dict(row)
+                if keys:
+                    # As with a unique index, NULL key values never conflict
+                    values = tuple(row.get(k) for k in keys)
+                    existing = index.get(values) if None not in values else None
+                    if existing is not None:
+                        if not ignore_duplicates:
+                            existing.update(row)
+                            written.append(dict(existing))
+                        continue
+                row.setdefault("id", next(self._ids))
+                table.append(row)
+                for (indexed_table, indexed_keys), other in self._indexes.items():
+                    values = tuple(row.get(k) for k in indexed_keys)
+                    if indexed_table == table_name and None not in values:
+                        other.setdefault(values, row)
+                written.append(dict(row))
+            return written
@@ -0,0 +1,147 @@
+"""
+Merchant canonicalisation: maps the many spellings of a payee ("SWIGGY",
+"Swiggy Instamart", "Swiggy Ltd 5521") to one merchant.
+
+A description is reduced to a token key (casefolded words, with reference
+numbers and legal/location suffixes dropped). The key is then matched against a
+token trie of known merchants, and the longest known prefix wins. Keys with
+no known prefix are their own merchant. The merchant id is a hash of the
+canonical key, so every worker and every later upload agree on it without
+shared state. Results are memoised per description.
+
+    merchant_id, name = canonical_merchant("Swiggy Instamart 5521")
+
+Backfill `transactions.merchant_id` for rows stored before it existed (from Backend/):
+    python merchants.py --backfill
+"""
+import os
+import re
+import hashlib
+import argparse
+from collections import defaultdict
+from functools import lru_cache
+
+MERCHANT_MEMO_SIZE = int(os.getenv("MERCHANT_MEMO_SIZE", 65536))
+# Unknown merchants keep at most this many leading tokens of their key
+MERCHANT_KEY_TOKENS = int(os.getenv("MERCHANT_KEY_TOKENS", 3))
+
+TOKEN_PATTERN = re.compile(r"[^\W_]+")
+
+# Words that never tell merchants apart
+NOISE_TOKENS = frozenset({
+    "pvt", "private", "ltd", "limited", "llp", "inc", "co", "company", "corp", "india", "in",
+    "www", "com", "upi", "pos", "ecom", "txn", "ref", "order", "payment", "bill", "the"
+})
+
+# Display names of merchants worth grouping under a prefix ("Swiggy Instamart" -> Swiggy)
+KNOWN_MERCHANTS = (
+    "Airtel", "Amazon", "Amazon Pay", "Apollo Pharmacy", "BigBasket", "Blinkit", "BookMyShow",
+    "Dominos", "Flipkart", "IRCTC", "Jio", "Myntra", "Netflix", "Nykaa", "Ola", "Paytm", "PhonePe",
+    "Rapido", "Spotify", "Swiggy", "Uber", "Zepto", "Zomato"
+)
+
+def merchant_tokens(description: str) -> tuple:
+    """ Normalised key tokens: casefolded words without numbers, references or noise words. """
+    tokens = []
+    for token in TOKEN_PATTERN.findall((description or "").casefold()):
+        # Numbers and reference codes ("5521", "t2412021015") identify a payment, not a payee
+        if token in NOISE_TOKENS or any(ch.isdigit() for ch in token):
+            continue
+        tokens.append(token)
+    return tuple(tokens)
+
+def merchant_id_for(key: str) -> str:
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
+class MerchantIndex:
+    """ Token trie of canonical merchant keys; lookups return the longest known prefix. """
+
+    END = object()
+
+    def __init__(self, names=KNOWN_MERCHANTS):
+        self.root = {}
+        for name in names:
+            self.add(name)
+
+    def add(self, name: str):
+        tokens = merchant_tokens(name)
+        if not tokens:
+            return
+        node = self.root
+        for token in tokens:
+            node = node.setdefault(token, {})
+        node[self.END] = name
+
+    def longest_prefix(self, tokens: tuple):
+        """ (length, display name) of the longest known merchant that `tokens` starts with. """
+        node, best = self.root, None
+        for depth, token in enumerate(tokens, start=1):
+            node = node.get(token)
+            if node is None:
+                break
+            if self.END in node:
+                best = (depth, node[self.END])
+        return best
+
+    def canonical(self, description: str) -> tuple:
+        """ (merchant_id, display name) for a transaction description. """
+        tokens = merchant_tokens(description)
+        known = self.longest_prefix(tokens)
+        if known:
+            length, name = known
+            key = " ".join(tokens[:length])
+        elif tokens:
+            key = " ".join(tokens[:MERCHANT_KEY_TOKENS])
+            name = key.title()
+        else:
+            # Nothing but numbers and noise: fall back to the raw text
+            key = " ".join((description or "").casefold().split())
+            name = (description or "").strip() or "Unknown"
+        return merchant_id_for(key), name
+
+merchant_index = MerchantIndex()
+
+@lru_cache(maxsize=MERCHANT_MEMO_SIZE)
+def canonical_merchant(description: str) -> tuple:
+    """ Memoised MerchantIndex.canonical on the shared index. """
+    return merchant_index.canonical(description)
+
+def with_merchants(transactions):
+    """ Yields the rows with their `merchant_id` set (the ingest-time enrichment). """
+    for tx in transactions:
+        yield {**tx, "merchant_id": canonical_merchant(tx.get("description") or "")[0]}
+
+def backfill_merchant_ids(client, page_size: int = 1000) -> int:
+    """ Sets merchant_id on stored rows without one, in id-ordered pages; one update per merchant per page. """
+    updated = 0
+    last_id = None
+    while True:
+        query = client.table("transactions").select("id, description").is_("merchant_id", "null")
+        if last_id is not None:
+            query = query.gt("id", last_id)
+        rows = query.order("id").limit(page_size).execute().data or []
+        by_merchant = defaultdict(list)
+        for tx in rows:
+            by_merchant[canonical_merchant(tx.get("description") or "")[0]].append(tx["id"])
+        for merchant_id, ids in by_merchant.items():
+            client.table("transactions").update({"merchant_id": merchant_id}).in_("id", ids).execute()
+        updated += len(rows)
+        if len(rows) < page_size:
+            break
+        last_id = rows[-1]["id"]
+    return updated
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    from repository import client_from_env
+
+    parser = argparse.ArgumentParser(description="Merchant canonicalisation maintenance.")
+    parser.add_argument("--backfill", action="store_true", help="set merchant_id on rows stored without one")
+    parser.add_argument("--page-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    load_dotenv()
+    if args.backfill:
+        print(f"Backfilled merchant_id on {backfill_merchant_ids(client_from_env(), args.page_size)} transactions")
+    else:
+        parser.print_help()
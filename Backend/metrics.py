@@ -0,0 +1,223 @@
+"""
+In-process latency and counter metrics for the hot paths.
+
+Stages are timed with named spans:
+
+    with span("predict.model"):
+        prediction = predict_expense(features)
+
+Every span is added to the `finflow_stage_seconds{stage=...}` histogram.
+Counters (rows parsed, LLM fallbacks, cache hits, ...) are declared where
+they are counted. GET /metrics renders everything in the Prometheus text
+format. Each gunicorn worker keeps its own registry, so a scrape sees the
+worker that answered it.
+
+A request sent with the `X-Profile: 1` header (or the PROFILE_TOKEN value,
+when one is set) gets its own stage breakdown back in a standard
+Server-Timing header, e.g.
+    Server-Timing: predict.fetch;dur=41.2, predict.model;dur=0.4, insights.llm;dur=812.5
+"""
+import os
+import time
+import asyncio
+import threading
+from contextvars import ContextVar
+
+# Histogram buckets in seconds, from sub-millisecond regex passes to multi-second model calls
+METRICS_BUCKETS = tuple(
+    float(b) for b in os.getenv("METRICS_BUCKETS", "0.001,0.005,0.01,0.025,0.05,0.1,0.25,0.5,1,2.5,5,10,30").split(",")
+)
+PROFILE_HEADER = os.getenv("PROFILE_HEADER", "x-profile").lower()
+# When set, only requests presenting this token get a breakdown back
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")
+METRICS_PREFIX = "finflow_"
+INF_LABEL = 'le="+Inf"'
+
+def escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{escape_label(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: tuple = ()):
+        self.name = METRICS_PREFIX + name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            for key, value in sorted(self.values.items()):
+                lines.append(f"{self.name}{format_labels(self.labelnames, key)} {value:g}")
+        return lines
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames: tuple = (), buckets: tuple = METRICS_BUCKETS):
+        self.name = METRICS_PREFIX + name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts, sum, count]
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self.lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            for key, (counts, total, count) in sorted(self.series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    le = format_labels(self.labelnames, key, f'le="{bound:g}"')
+                    lines.append(f"{self.name}_bucket{le} {cumulative}")
+                lines.append(f"{self.name}_bucket{format_labels(self.labelnames, key, INF_LABEL)} {count}")
+                lines.append(f"{self.name}_sum{format_labels(self.labelnames, key)} {total:.6f}")
+                lines.append(f"{self.name}_count{format_labels(self.labelnames, key)} {count}")
+        return lines
+
+class Gauge:
+    """ A value read from `fn()` at scrape time (queue depths, pool usage). """
+
+    def __init__(self, name: str, help: str, fn):
+        self.name = METRICS_PREFIX + name
+        self.help = help
+        self.fn = fn
+
+    def render(self) -> list:
+        try:
+            value = float(self.fn())
+        except Exception:
+            return []
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge", f"{self.name} {value:g}"]
+
+registry = []
+
+def counter(name: str, help: str, labelnames: tuple = ()) -> Counter:
+    metric = Counter(name, help, labelnames)
+    registry.append(metric)
+    return metric
+
+def histogram(name: str, help: str, labelnames: tuple = (), buckets: tuple = METRICS_BUCKETS) -> Histogram:
+    metric = Histogram(name, help, labelnames, buckets)
+    registry.append(metric)
+    return metric
+
+def gauge(name: str, help: str, fn) -> Gauge:
+    metric = Gauge(name, help, fn)
+    registry.append(metric)
+    return metric
+
+def render() -> str:
+    lines = []
+    for metric in registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+stage_seconds = histogram("stage_seconds", "Time spent in each named hot-path stage.", ("stage",))
+request_seconds = histogram("http_request_seconds", "Request latency by route.", ("method", "route", "status"))
+errors_total = counter("errors_total", "Exceptions caught by an endpoint or stage.", ("stage",))
+
+# --- per-request profiles ---
+class Profile:
+    """ Stage timings of one request; closed once the response has started. """
+
+    def __init__(self):
+        self.stages = []
+        self.open = True
+
+    def add(self, stage: str, seconds: float):
+        if self.open:
+            self.stages.append((stage, seconds))
+
+    def server_timing(self) -> str:
+        return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in self.stages)
+
+current_profile = ContextVar("current_profile", default=None)
+
+def record(stage: str, seconds: float):
+    stage_seconds.observe(seconds, stage=stage)
+    profile = current_profile.get()
+    if profile is not None:
+        profile.add(stage, seconds)
+
+class span:
+    """ Times a block as `stage`: `with span("upload.extract"): ...` (also fine around awaits). """
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        record(self.stage, time.perf_counter() - self.start)
+        if exc_type is not None and not issubclass(exc_type, asyncio.CancelledError):
+            errors_total.inc(stage=self.stage)
+        return False
+
+class MetricsMiddleware:
+    """ Records request latency per route and answers opted-in requests with a Server-Timing breakdown. """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        requested = dict(scope["headers"]).get(PROFILE_HEADER.encode())
+        wanted = requested is not None and (
+            requested.decode("latin-1") == PROFILE_TOKEN if PROFILE_TOKEN else requested in (b"1", b"true")
+        )
+        profile = Profile() if wanted else None
+        token = current_profile.set(profile)
+        start = time.perf_counter()
+        status = 500
+
+        async def timed_send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if profile is not None:
+                    profile.add("total", time.perf_counter() - start)
+                    profile.open = False
+                    message = {**message, "headers": [
+                        *message.get("headers", []), (b"server-timing", profile.server_timing().encode())
+                    ]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, timed_send)
+        finally:
+            current_profile.reset(token)
+            if profile is not None:
+                profile.open = False
+            # Route templates ('/jobs/{job_id}') keep the label set small; unmatched paths share one label
+            route = getattr(scope.get("route"), "path", "unmatched")
+            request_seconds.observe(time.perf_counter() - start, method=scope["method"], route=route, status=str(status))
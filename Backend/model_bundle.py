@@ -0,0 +1,85 @@
+"""
+Versioned artifact bundles for the spending model.
+
+train_model.py writes one directory per training run, and spending.py loads
+it as a whole:
+
+    artifacts/spending/
+        LATEST                      name of the current version
+        20261017-050108/
+            manifest.json           feature order, category encodings, metrics, params, dataset
+            forest/                 CompactForest arrays (memory-mapped by the service)
+            model.pkl               the scikit-learn estimator (only with --pickle)
+
+The manifest carries everything needed to encode a request the way the
+model was trained, so a retrain never means editing code. A bundle is
+written under a temporary name and renamed into place, and LATEST is
+replaced last, so a worker that starts mid-write still sees the previous
+version.
+"""
+import os
+import json
+import shutil
+from datetime import datetime
+from forest import CompactForest
+
+BUNDLE_FORMAT = 1
+MANIFEST_NAME = "manifest.json"
+FOREST_DIR = "forest"
+PICKLE_NAME = "model.pkl"
+LATEST_NAME = "LATEST"
+
+def new_version() -> str:
+    return datetime.now().strftime("%Y%m%d-%H%M%S")
+
+def resolve_bundle(path: str):
+    """ The version directory for `path`: itself if it holds a manifest, else the one LATEST names. """
+    if os.path.isfile(os.path.join(path, MANIFEST_NAME)):
+        return path
+    latest = os.path.join(path, LATEST_NAME)
+    if os.path.isfile(latest):
+        with open(latest) as f:
+            version = f.read().strip()
+        if version and os.path.isfile(os.path.join(path, version, MANIFEST_NAME)):
+            return os.path.join(path, version)
+    return None
+
+def save_bundle(root: str, forest: CompactForest, manifest: dict, model=None, version: str = None) -> str:
+    """ Writes a new version under `root`, points LATEST at it and returns its directory. """
+    version = version or new_version()
+    final = os.path.join(root, version)
+    staging = os.path.join(root, f".{version}.tmp")
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+
+    forest.save(os.path.join(staging, FOREST_DIR))
+    if model is not None:
+        import joblib
+        joblib.dump(model, os.path.join(staging, PICKLE_NAME))
+    with open(os.path.join(staging, MANIFEST_NAME), "w") as f:
+        json.dump({"format": BUNDLE_FORMAT, "version": version, **manifest}, f, indent=2)
+    os.replace(staging, final)
+
+    pointer = os.path.join(root, f".{LATEST_NAME}.tmp")
+    with open(pointer, "w") as f:
+        f.write(version + "\n")
+    os.replace(pointer, os.path.join(root, LATEST_NAME))
+    return final
+
+def load_manifest(path: str) -> dict:
+    with open(os.path.join(path, MANIFEST_NAME)) as f:
+        manifest = json.load(f)
+    if manifest.get("format") != BUNDLE_FORMAT:
+        raise ValueError(f"Unsupported model bundle format {manifest.get('format')!r} in {path}")
+    return manifest
+
+def load_bundle(path: str, mmap: bool = True) -> tuple:
+    """ (forest, manifest) of the bundle at `path` (a version directory or a root with LATEST). """
+    resolved = resolve_bundle(path)
+    if resolved is None:
+        raise FileNotFoundError(f"No model bundle at {path}")
+    manifest = load_manifest(resolved)
+    forest = CompactForest.load(os.path.join(resolved, FOREST_DIR), mmap=mmap)
+    if forest.feature_names and forest.feature_names != manifest["feature_order"]:
+        raise ValueError(f"Forest features {forest.feature_names} do not match the manifest's {manifest['feature_order']}")
+    return forest, manifest
@@ -0,0 +1,31 @@
+"""
+PDF text extraction run inside Parser.py's process pool.
+
+Kept apart from Parser.py so a pool worker, started with forkserver or spawn,
+imports only pdfplumber and not the web app, its thread pools and clients.
+"""
+import io
+from clients import lazy_import
+
+# pdfplumber (and pdfminer under it) is only imported when the first PDF is opened
+pdfplumber = lazy_import("pdfplumber")
+
+def iter_page_texts(pdf, start: int = 0, stop: int = None):
+    """ Yields the text of pages [start, stop) of an open PDF in order. """
+    for page in pdf.pages[start:stop]:
+        text = page.extract_text()
+        # Drop the page's cached layout objects before moving on
+        page.close()
+        if text:
+            yield text
+
+def extract_leading_pages(pdf_bytes: bytes, stop: int = None) -> tuple:
+    """ (page count, texts of pages [0, stop)) from one open; stop=None reads the whole document. """
+    with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
+        return len(pdf.pages), list(iter_page_texts(pdf, 0, stop))
+
+def extract_page_range(pdf_bytes: bytes, start: int, stop: int) -> list:
+    """ Texts of pages [start, stop) in order. """
+    # pdfplumber numbers pages from 1
+    with pdfplumber.open(io.BytesIO(pdf_bytes), pages=range(start + 1, stop + 1)) as pdf:
+        return list(iter_page_texts(pdf))
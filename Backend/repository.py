@@ -0,0 +1,177 @@
+"""
+Shared async data access for the services.
+
+One Repository per process wraps one PostgREST client, whose HTTP connection
+pool is kept alive between requests, and a thread pool of the same size for
+the blocking calls. Handlers await typed operations (insert transactions,
+fetch a user's window, upsert spending_results, job snapshots) and the event loop never waits
+on the network. The query helpers in transaction_fetch.py, user_summary.py and
+bulk_writer.py are unchanged; they run on that pool against the shared client.
+
+    repo = get_repository()
+    rows = await repo.fetch_transactions(user_id, start="2025-01-01")
+
+DB_BACKEND=memory serves everything from memory_store.InMemoryClient, so the
+service and its benchmarks run locally with no network.
+"""
+import os
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from bulk_writer import BulkWriteResult, bulk_insert
+from dedupe import with_fingerprints
+from transaction_fetch import (
+    ANALYTICS_COLUMNS, fetch_existing_transactions, fetch_user_transactions, iter_users_transactions
+)
+from user_summary import load_summary, load_summaries, load_watermark, record_ingested, rebuild_summary, touch_watermark
+from exclusions import ExclusionMatcher, load_exclusions, save_exclusions, user_matcher, user_matchers
+
+# Backend and pool settings
+DB_BACKEND = os.getenv("DB_BACKEND", "supabase")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 16))
+DB_KEEPALIVE_SECONDS = float(os.getenv("DB_KEEPALIVE_SECONDS", 60))
+DB_TIMEOUT_SECONDS = float(os.getenv("DB_TIMEOUT_SECONDS", 30))
+
+def pooled_client(url: str, key: str, pool_size: int = DB_POOL_SIZE,
+                  keepalive: float = DB_KEEPALIVE_SECONDS, timeout: float = DB_TIMEOUT_SECONDS):
+    """
+    PostgREST client for the Supabase REST endpoint with an explicit connection
+    pool. It exposes the same `.table(...)` query builder as the Supabase client
+    without pulling in the auth, storage and realtime clients.
+    """
+    import httpx
+    from postgrest import SyncPostgrestClient
+    from postgrest.constants import DEFAULT_POSTGREST_CLIENT_HEADERS
+
+    limits = httpx.Limits(
+        max_connections=pool_size, max_keepalive_connections=pool_size, keepalive_expiry=keepalive
+    )
+
+    class PooledPostgrestClient(SyncPostgrestClient):
+        def create_session(self, base_url, headers, timeout, verify=True, proxy=None):
+            return httpx.Client(
+                base_url=base_url, headers=headers, timeout=timeout, verify=verify, proxy=proxy,
+                follow_redirects=True, http2=True, limits=limits
+            )
+
+    headers = {**DEFAULT_POSTGREST_CLIENT_HEADERS, "apikey": key, "Authorization": f"Bearer {key}"}
+    return PooledPostgrestClient(f"{url.rstrip('/')}/rest/v1", headers=headers, timeout=timeout)
+
+def client_from_env():
+    return pooled_client(os.getenv("VITE_SUPABASE_URL"), os.getenv("SUPABASE_SERVICE_ROLE_KEY"))
+
+class Repository:
+    """ Async operations over a blocking table client (Supabase/PostgREST or in-memory). """
+
+    def __init__(self, client, pool_size: int = DB_POOL_SIZE):
+        self.client = client
+        # Threads are started on first use, so a pre-fork master never owns any
+        self.executor = ThreadPoolExecutor(max_workers=max(pool_size, 1), thread_name_prefix="db")
+
+    @classmethod
+    def from_env(cls):
+        if DB_BACKEND == "memory":
+            return cls.in_memory()
+        return cls(client_from_env())
+
+    @classmethod
+    def in_memory(cls, **kwargs):
+        from memory_store import InMemoryClient
+        return cls(InMemoryClient(**kwargs))
+
+    async def run(self, fn, *args, **kwargs):
+        """ Calls `fn(client, *args, **kwargs)` on the pool. """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, partial(fn, self.client, *args, **kwargs))
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+        session = getattr(self.client, "session", None)
+        if session is not None:
+            session.close()
+
+    # --- transactions ---
+    async def insert_transactions(self, rows: list, **options) -> BulkWriteResult:
+        # Keyed on the unique fingerprint column, so retrying a batch never stores a row twice
+        return await bulk_insert(
+            self.client, "transactions", with_fingerprints(rows), on_conflict="fingerprint",
+            ignore_duplicates=True, executor=self.executor, **options
+        )
+
+    async def existing_transactions(self, user_id: str, transactions: list) -> list:
+        return await self.run(fetch_existing_transactions, user_id, transactions)
+
+    async def fetch_transactions(self, user_id: str, start: str = None, end: str = None,
+                                 columns: str = ANALYTICS_COLUMNS) -> list:
+        return await self.run(fetch_user_transactions, user_id, start, end, columns)
+
+    async def fetch_users_transactions(self, user_ids: list, start: str = None, end: str = None,
+                                       columns: str = ANALYTICS_COLUMNS) -> list:
+        return await self.run(lambda client: list(iter_users_transactions(client, user_ids, start, end, columns)))
+
+    # --- spending summaries ---
+    async def load_summary(self, user_id: str):
+        return await self.run(load_summary, user_id)
+
+    async def load_summaries(self, user_ids: list) -> dict:
+        return await self.run(load_summaries, user_ids)
+
+    async def rebuild_summary(self, user_id: str) -> dict:
+        return await self.run(rebuild_summary, user_id)
+
+    async def record_ingested(self, user_id: str, transactions: list) -> tuple:
+        return await self.run(record_ingested, user_id, transactions)
+
+    async def transaction_watermark(self, user_id: str) -> tuple:
+        return await self.run(load_watermark, user_id)
+
+    async def touch_watermark(self, user_id: str):
+        await self.run(touch_watermark, user_id)
+
+    # --- exclusion lists ---
+    async def load_exclusions(self, user_id: str) -> tuple:
+        return await self.run(load_exclusions, user_id)
+
+    async def save_exclusions(self, user_id: str, names: list) -> tuple:
+        return await self.run(save_exclusions, user_id, names)
+
+    async def exclusion_matcher(self, user_id: str) -> ExclusionMatcher:
+        return await self.run(user_matcher, user_id)
+
+    async def exclusion_matchers(self, user_ids: list) -> dict:
+        return await self.run(user_matchers, user_ids)
+
+    # --- spending results ---
+    async def upsert_spending_result(self, entry: dict):
+        await self.run(lambda client: client.table("spending_results").upsert(entry, on_conflict="user_id").execute())
+
+    async def upsert_spending_results(self, entries: list, **options) -> BulkWriteResult:
+        return await bulk_insert(
+            self.client, "spending_results", entries, on_conflict="user_id", executor=self.executor, **options
+        )
+
+    # --- background jobs ---
+    async def save_job(self, snapshot: dict):
+        await self.run(lambda client: client.table("jobs").upsert(snapshot, on_conflict="job_id").execute())
+
+    async def load_job(self, job_id: str):
+        response = await self.run(lambda client: client.table("jobs").select("*").eq("job_id", job_id).execute())
+        return response.data[0] if response.data else None
+
+repository = None
+
+def get_repository() -> Repository:
+    global repository
+    if repository is None:
+        repository = Repository.from_env()
+    return repository
+
+def set_repository(repo: Repository):
+    """ Swaps the process-wide repository, e.g. for Repository.in_memory() in tests. """
+    global repository
+    repository = repo
+
+def close_repository():
+    global repository
+    if repository is not None:
+        repository.close()
@@ -1,13 +1,21 @@
 import os
-import joblib
-import pandas as pd
-import uvicorn
-from fastapi import FastAPI, Form
+import asyncio
+import hashlib
+from collections import defaultdict
+from fastapi import FastAPI, Form, APIRouter
+from pydantic import BaseModel
 from fastapi.middleware.cors import CORSMiddleware
-from supabase import create_client
 from dotenv import load_dotenv
-from datetime import datetime
-from insights import generate_spending_insights 
+from datetime import date, datetime, timedelta
+from insights import generate_spending_insights_async, generate_template_insights
+from analytics import TransactionFrame
+from forest import CompactForest
+from model_bundle import load_bundle, resolve_bundle
+from repository import get_repository
+from jobs import QueueFullError, job_queue, queue_full_response, queued_response, router as jobs_router
+from user_summary import actual_monthly_expense as summary_monthly_expense, summary_watermark
+from metrics import counter, errors_total, span
+from cache import LRUCache
 
 # 1. Load environment variables
 load_dotenv()
@@ -27,21 +35,312 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# 4. Initialize Supabase client
-supabase = create_client(
-    os.getenv("VITE_SUPABASE_URL"), 
-    os.getenv("SUPABASE_SERVICE_ROLE_KEY")
-)
+# 4. Predict routes live on a router so main.py can mount them next to the parser's
+# (database access goes through the shared, pooled repository in repository.py)
+router = APIRouter()
+
+# 5. Global Model Loading (once per process, on first use, to save RAM and startup time)
+# train_model.py writes a versioned bundle (model_bundle.py): the compact array forest,
+# memory-mapped read-only so workers forked after loading share its pages, plus the
+# encodings and feature order it was trained with. A bare forest or the pickle is the fallback
+BUNDLE_PATH = os.getenv("SPENDING_BUNDLE_PATH", "artifacts/spending")
+FOREST_PATH = os.getenv("SPENDING_FOREST_PATH", "spending_forest")
+MODEL_PATH = os.getenv("SPENDING_MODEL_PATH", "spending_model.pkl")
+
+FEATURE_ORDER = [
+    "monthly_income_inr", "education_level", "employment_status", 
+    "job_title", "has_loan", "loan_type", "loan_term_months", 
+    "monthly_emi_inr", "loan_interest_rate_pct", "credit_score"
+]
+
+model = None
+model_loaded = False
+# Manifest of the loaded bundle; None when a legacy artifact (or nothing) was loaded
+model_manifest = None
+
+def get_model():
+    """ The spending model, loaded on the first call; None if no artifact could be loaded. """
+    global model, model_loaded, model_manifest
+    if not model_loaded:
+        try:
+            # Ensure this file is in the same directory on Render
+            if BUNDLE_PATH and resolve_bundle(BUNDLE_PATH):
+                forest, manifest = load_bundle(BUNDLE_PATH)
+                unknown = set(manifest["feature_order"]) - set(FEATURE_ORDER)
+                if unknown:
+                    raise ValueError(f"Bundle {manifest['version']} needs features this service cannot build: {sorted(unknown)}")
+                model, model_manifest = forest, manifest
+            elif os.path.exists(FOREST_PATH):
+                model = CompactForest.load(FOREST_PATH)
+            else:
+                import joblib
+                model = joblib.load(MODEL_PATH)
+        except Exception as e:
+            print(f"CRITICAL: Model Load Error: {e}")
+            model = None
+        model_loaded = True
+    return model
+
+def model_version():
+    return model_manifest["version"] if model_manifest else None
+
+# Category encodings of the legacy artifacts (LabelEncoder order from the old train_model.py);
+# a bundle brings its own, with aliases for the form labels its dataset spells differently.
+# The form already sends INR, so no conversion applies (train_model.py converts its USD dataset)
+EXCHANGE_RATE = 1.0
+edu_map = {"Bachelor's": 0, "High School": 1, "Master's": 2, "Other": 3, "PhD": 4}
+emp_map = {'Employed': 0, 'Self-employed': 1, 'Student': 2, 'Unemployed': 3}
+job_map = {'Accountant': 0, 'Doctor': 1, 'Driver': 2, 'AI/ML Engineer': 3, 'Manager': 4, 'Salesperson': 5, 'Student': 6, 'Teacher': 7, 'Unemployed': 8}
+loan_type_map = {'Business': 0, 'Car': 1, 'Education': 2, 'Home': 3, 'Personal': 0, 'None': 4}
+LEGACY_ENCODINGS = {"education_level": edu_map, "employment_status": emp_map, "job_title": job_map, "loan_type": loan_type_map}
+LEGACY_FALLBACKS = {"education_level": "Other", "employment_status": "Unemployed", "job_title": "Unemployed", "loan_type": "None"}
+
+def encode_label(column: str, value: str, encodings: dict, fallbacks: dict, aliases: dict = None) -> int:
+    mapping = encodings[column]
+    code = mapping.get(value)
+    if code is None:
+        alias = (aliases or {}).get(column, {}).get(value)
+        code = mapping.get(alias, mapping.get(fallbacks.get(column), 0))
+    return code
+
+def encode_profile(monthly_income, education, employment, job_title, has_loan, loan_type,
+                   loan_term_months, monthly_emi_usd, loan_interest_rate_pct, credit_score) -> list:
+    """ Encodes one profile into a feature row, in the loaded model's feature order. """
+    get_model()
+    if model_manifest:
+        encodings, fallbacks = model_manifest["encodings"], model_manifest["fallback_labels"]
+        aliases, order = model_manifest.get("label_aliases"), model_manifest["feature_order"]
+    else:
+        encodings, fallbacks, aliases, order = LEGACY_ENCODINGS, LEGACY_FALLBACKS, None, FEATURE_ORDER
+
+    values = {
+        "monthly_income_inr": monthly_income * EXCHANGE_RATE,
+        "education_level": encode_label("education_level", education, encodings, fallbacks, aliases),
+        "employment_status": encode_label("employment_status", employment, encodings, fallbacks, aliases),
+        "job_title": encode_label("job_title", job_title, encodings, fallbacks, aliases),
+        "has_loan": 1 if has_loan.lower() == "yes" else 0,
+        "loan_type": encode_label("loan_type", loan_type, encodings, fallbacks, aliases),
+        "loan_term_months": loan_term_months,
+        "monthly_emi_inr": monthly_emi_usd * EXCHANGE_RATE,
+        "loan_interest_rate_pct": loan_interest_rate_pct,
+        "credit_score": credit_score
+    }
+    return [values[name] for name in order]
+
+def predict_expenses(feature_rows: list) -> list:
+    """ Runs the spending model on encoded feature rows in one vectorised call. """
+    model = get_model()
+    if isinstance(model, CompactForest):
+        return model.predict(feature_rows).tolist()
+
+    # Pickled scikit-learn fallback expects the named DataFrame it was trained on
+    import pandas as pd
+    return model.predict(pd.DataFrame(feature_rows, columns=FEATURE_ORDER)).tolist()
+
+def predict_expense(features: list) -> float:
+    model = get_model()
+    if isinstance(model, CompactForest):
+        return model.predict_one(features)
+    return predict_expenses([features])[0]
+
+# 6. Insights look at a recent window; the all-time figures come from the per-user summary
+INSIGHT_WINDOW_DAYS = int(os.getenv("INSIGHT_WINDOW_DAYS", 180))
+
+# 7. Batch scoring processes users in chunks to keep memory bounded. Users whose insight
+# windows start within BATCH_WINDOW_SLACK_DAYS of each other share one fetch, so no user's
+# history is read more than that many days past their own window
+BATCH_CHUNK_USERS = int(os.getenv("BATCH_CHUNK_USERS", 500))
+BATCH_WINDOW_SLACK_DAYS = int(os.getenv("BATCH_WINDOW_SLACK_DAYS", 7))
+
+# 8. Outcome counter for /predict; stage timings are spans (see metrics.py)
+predictions_total = counter("predictions_total", "/predict requests by outcome.", ("status",))
+
+# 9. Memoised /predict results: (user, hash of the normalised form) -> (watermark, response)
+# An entry is served only while the user's transaction watermark (row count, latest date,
+# last summary update; see user_summary.py) is the one it was computed at, so an ingest
+# or a rebuild makes it stale. Hits skip the fetch, the model, the LLM and the upsert
+PREDICT_CACHE_SIZE = int(os.getenv("PREDICT_CACHE_SIZE", 4096))
+PREDICT_CACHE_TTL_SECONDS = float(os.getenv("PREDICT_CACHE_TTL_SECONDS", 900))
+prediction_results = LRUCache(maxsize=PREDICT_CACHE_SIZE, ttl=PREDICT_CACHE_TTL_SECONDS)
+predict_cache_total = counter("predict_cache_total", "/predict result cache lookups by outcome.", ("outcome",))
+
+def insight_window_start(summary: dict):
+    if not summary["max_date"]:
+        return None
+    return (date.fromisoformat(summary["max_date"]) - timedelta(days=INSIGHT_WINDOW_DAYS)).isoformat()
+
+def window_groups(starts: dict) -> list:
+    """ [(fetch start, user ids)] covering `starts` (user -> window start) within the slack. """
+    groups = []
+    unbounded = [user_id for user_id, start in starts.items() if not start]
+    if unbounded:
+        groups.append((None, unbounded))
+    group_start, group = None, []
+    for user_id, start in sorted(((u, s) for u, s in starts.items() if s), key=lambda item: item[1]):
+        if group and (date.fromisoformat(start) - date.fromisoformat(group_start)).days > BATCH_WINDOW_SLACK_DAYS:
+            groups.append((group_start, group))
+            group = []
+        if not group:
+            group_start = start
+        group.append(user_id)
+    if group:
+        groups.append((group_start, group))
+    return groups
+
+class ProfileInput(BaseModel):
+    user_id: str
+    monthly_income: float
+    job_title: str
+    education: str
+    employment: str
+    has_loan: str
+    loan_type: str = "None"
+    loan_term_months: int = 0
+    monthly_emi_usd: float = 0.0
+    loan_interest_rate_pct: float = 0.0
+    credit_score: int = 700
+
+def prediction_key(p: ProfileInput, window_start: str = None, window_end: str = None) -> tuple:
+    """
+    (user_id, digest) of everything the response depends on besides the history:
+    the encoded feature row, the fields quoted to the LLM and the window. Forms
+    that encode alike (e.g. has_loan 'Yes' and 'yes') share a key.
+    """
+    features = encode_profile(
+        p.monthly_income, p.education, p.employment, p.job_title, p.has_loan, p.loan_type,
+        p.loan_term_months, p.monthly_emi_usd, p.loan_interest_rate_pct, p.credit_score
+    )
+    form = (features, p.job_title, p.education, window_start or None, window_end or None)
+    return p.user_id, hashlib.sha1(repr(form).encode("utf-8")).hexdigest()
+
+async def run_prediction(p: ProfileInput, window_start: str = None, window_end: str = None, on_numbers=None) -> dict:
+    """
+    The /predict pipeline. The model's numbers are computed before the AI
+    insights, and `await on_numbers({...})` hands them out as soon as they exist.
+    An unchanged form over an unchanged history is answered from prediction_results.
+    """
+    repo = get_repository()
+
+    # 0. Same form, same watermark: the stored response is still the answer. The watermark
+    # is read from the database, so ingests through any worker retire the entry at once
+    with span("predict.cache"):
+        key = prediction_key(p, window_start, window_end)
+        cached = prediction_results.get(key)
+        if cached is not None and cached[0] != await repo.transaction_watermark(p.user_id):
+            cached = None
+    if cached is not None:
+        predict_cache_total.inc(outcome="hit")
+        result = cached[1]
+        if on_numbers:
+            await on_numbers({"prediction": result["prediction"], "actual": result["actual"]})
+        return dict(result)
+    predict_cache_total.inc(outcome="miss")
+
+    # 1. Per-user running totals (built once for users ingested before summaries existed)
+    with span("predict.summary"):
+        summary = await repo.load_summary(p.user_id) or await repo.rebuild_summary(p.user_id)
+    if not summary["tx_count"]:
+        return {"status": "error", "message": "No transaction history found."}
+    # The result is filed under the history it is computed from; rows landing
+    # after this point move the watermark and leave the entry stale
+    watermark = summary_watermark(summary)
+
+    # 2. Fetch the analysed window only (analytics columns, keyset-paged)
+    windowed = bool(window_start or window_end)
+    if not windowed and summary["max_date"]:
+        window_end = summary["max_date"]
+        window_start = insight_window_start(summary)
+    with span("predict.fetch"):
+        transactions = await repo.fetch_transactions(p.user_id, start=window_start, end=window_end)
+
+    if not transactions:
+        return {"status": "error", "message": "No transaction history found."}
+    with span("predict.exclusions"):
+        exclusions = await repo.exclusion_matcher(p.user_id)
+
+    # Time-Period Normalization: O(1) from the summary unless a custom window was asked for
+    with span("predict.frame"):
+        frame = TransactionFrame(transactions)
+        if windowed:
+            actual_monthly_expense = frame.actual_monthly_expense()
+        else:
+            actual_monthly_expense = summary_monthly_expense(summary)
+
+    # 3. ML Prediction Logic
+    with span("predict.model"):
+        features = encode_profile(
+            p.monthly_income, p.education, p.employment, p.job_title, p.has_loan, p.loan_type,
+            p.loan_term_months, p.monthly_emi_usd, p.loan_interest_rate_pct, p.credit_score
+        )
+
+        if get_model():
+            predicted_amt = predict_expense(features)
+        else:
+            predicted_amt = p.monthly_income * 0.7
+
+    if on_numbers:
+        await on_numbers({"prediction": round(predicted_amt, 2), "actual": round(actual_monthly_expense, 2)})
+
+    # 4. Generate AI Insights (Imported from insights.py)
+    profile_payload = {
+        "user_id": p.user_id,
+        "monthly_income": p.monthly_income,
+        "monthly_emi": p.monthly_emi_usd,
+        "interest_rate": p.loan_interest_rate_pct,
+        "job_title": p.job_title,
+        "education_level": p.education
+    }
+
+    with span("predict.insights"):
+        analysis = await generate_spending_insights_async(
+            profile_data=profile_payload, 
+            transactions=transactions,
+            summary=None if windowed else summary,
+            frame=frame,
+            exclusions=exclusions
+        )
+
+    # 5. Upsert Results to Supabase
+    result_entry = {
+        "user_id": p.user_id,
+        "monthly_income_usd": p.monthly_income,
+        "actual_monthly_expense": round(actual_monthly_expense, 2),
+        "predicted_next_month_expense": round(predicted_amt, 2),
+        "job_title": p.job_title,
+        "education_level": p.education,
+        "loan_interest_rate_pct": p.loan_interest_rate_pct,
+        "suggestion": " | ".join(analysis.get("suggestions", [])),
+        "calculation_date": datetime.now().isoformat()
+    }
+    
+    with span("predict.store"):
+        await repo.upsert_spending_result(result_entry)
 
-# 5. Global Model Loading (Avoids reloading on every request to save RAM)
-try:
-    # Ensure this file is in the same directory on Render
-    model = joblib.load("spending_model.pkl")
-except Exception as e:
-    print(f"CRITICAL: Model Load Error: {e}")
-    model = None
+    result = {
+        "status": "success",
+        "prediction": round(predicted_amt, 2),
+        "actual": round(actual_monthly_expense, 2),
+        "suggestions": analysis.get("suggestions", []),
+        "alerts": analysis.get("alerts", [])
+    }
+    # Only successes are memoised; errors (no history yet) are retried in full
+    prediction_results.put(key, (watermark, result))
+    return dict(result)
 
-@app.post("/predict")
+def prediction_job(p: ProfileInput, window_start: str = None, window_end: str = None):
+    """ Job handler: publishes 'numbers' first, then 'insights' once the model has answered. """
+    async def handler(job):
+        async def on_numbers(numbers):
+            await job.publish("numbers", numbers)
+
+        result = await run_prediction(p, window_start, window_end, on_numbers=on_numbers)
+        if result["status"] != "success":
+            raise ValueError(result["message"])
+        await job.publish("insights", {"suggestions": result["suggestions"], "alerts": result["alerts"]})
+        return result
+    return handler
+
+@router.post("/predict")
 async def predict_spending(
     user_id: str = Form(...),
     monthly_income: float = Form(...),
@@ -53,106 +352,185 @@ async def predict_spending(
     loan_term_months: int = Form(0),
     monthly_emi_usd: float = Form(0.0),
     loan_interest_rate_pct: float = Form(0.0),
-    credit_score: int = Form(700)
+    credit_score: int = Form(700),
+    window_start: str = Form(None),
+    window_end: str = Form(None),
+    background: bool = Form(False)
 ):
     try:
-        EXCHANGE_RATE = 1.0 
-        
-        # 1. Fetch Transaction History from Supabase
-        response = supabase.table("transactions")\
-            .select("*")\
-            .eq("user_id", user_id)\
-            .execute()
-        
-        if not response.data:
-            return {"status": "error", "message": "No transaction history found."}
-
-        # 2. Time-Period Normalization
-        dates = [datetime.strptime(tx['date'], '%Y-%m-%d') for tx in response.data if tx.get('date')]
-        days_diff = (max(dates) - min(dates)).days if len(dates) > 1 else 1
-        
-        raw_total_expense = sum(abs(float(tx['amount'])) for tx in response.data if float(tx['amount']) < 0)
-        actual_monthly_expense = (raw_total_expense / max(days_diff, 1)) * 30.44
-
-        # 3. Generate AI Insights (Imported from insights.py)
-        profile_payload = {
-            "monthly_income": monthly_income,
-            "monthly_emi": monthly_emi_usd,
-            "interest_rate": loan_interest_rate_pct,
-            "job_title": job_title,
-            "education_level": education
-        }
+        profile = ProfileInput(
+            user_id=user_id, monthly_income=monthly_income, job_title=job_title, education=education,
+            employment=employment, has_loan=has_loan, loan_type=loan_type, loan_term_months=loan_term_months,
+            monthly_emi_usd=monthly_emi_usd, loan_interest_rate_pct=loan_interest_rate_pct, credit_score=credit_score
+        )
 
-        analysis = generate_spending_insights(
-            profile_data=profile_payload, 
-            transactions=response.data
+        # Background mode answers with a job id; see jobs.py for /jobs/{id} and its event stream
+        if background:
+            job = job_queue.submit("predict", prediction_job(profile, window_start, window_end))
+            return queued_response(job)
+
+        result = await run_prediction(profile, window_start, window_end)
+        predictions_total.inc(status=result["status"])
+        return result
+
+    except QueueFullError as e:
+        predictions_total.inc(status="rejected")
+        return queue_full_response(e)
+    except Exception as e:
+        print(f"Prediction Error: {e}")
+        errors_total.inc(stage="predict")
+        predictions_total.inc(status="error")
+        return {"status": "error", "message": str(e)}
+
+class BatchPredictRequest(BaseModel):
+    profiles: list[ProfileInput]
+    # Gemini suggestions are optional for nightly runs; templates are instant
+    ai_insights: bool = False
+
+async def score_profile_chunk(profiles: list, ai_insights: bool) -> tuple:
+    """ Scores one chunk of users: bulk fetch, one feature matrix, one predict call. """
+    user_ids = [p.user_id for p in profiles]
+    repo = get_repository()
+
+    # 1. Summaries in one round-trip (rebuilt once for users that predate them)
+    summaries = await repo.load_summaries(user_ids)
+    for user_id in user_ids:
+        if user_id not in summaries:
+            summaries[user_id] = await repo.rebuild_summary(user_id)
+
+    exclusions = await repo.exclusion_matchers(user_ids)
+    scored = [p for p in profiles if summaries[p.user_id]["tx_count"]]
+    skipped = [p.user_id for p in profiles if not summaries[p.user_id]["tx_count"]]
+    if not scored:
+        return [], [], skipped
+
+    # 2. Insight windows, one id-ordered scan per group of users with nearby window starts
+    starts = {p.user_id: insight_window_start(summaries[p.user_id]) for p in scored}
+    fetched = await asyncio.gather(*[
+        repo.fetch_users_transactions(group, start=group_start) for group_start, group in window_groups(starts)
+    ])
+    grouped = defaultdict(list)
+    for tx in (tx for rows in fetched for tx in rows):
+        start = starts[tx["user_id"]]
+        if not start or tx["date"] >= start:
+            grouped[tx["user_id"]].append(tx)
+
+    # 3. One vectorised prediction for the whole chunk
+    features = [
+        encode_profile(
+            p.monthly_income, p.education, p.employment, p.job_title, p.has_loan, p.loan_type,
+            p.loan_term_months, p.monthly_emi_usd, p.loan_interest_rate_pct, p.credit_score
         )
+        for p in scored
+    ]
+    predictions = predict_expenses(features) if get_model() else [p.monthly_income * 0.7 for p in scored]
 
-        # 4. ML Prediction Logic
-        edu_map = {"Bachelor's": 0, "High School": 1, "Master's": 2, "Other": 3, "PhD": 4}
-        emp_map = {'Employed': 0, 'Self-employed': 1, 'Student': 2, 'Unemployed': 3}
-        job_map = {'Accountant': 0, 'Doctor': 1, 'Driver': 2, 'AI/ML Engineer': 3, 'Manager': 4, 'Salesperson': 5, 'Student': 6, 'Teacher': 7, 'Unemployed': 8}
-        loan_type_map = {'Business': 0, 'Car': 1, 'Education': 2, 'Home': 3, 'Personal': 0, 'None': 4}
-
-        is_loan_val = 1 if has_loan.lower() == "yes" else 0
-        
-        input_row = {
-            "monthly_income_inr": monthly_income * EXCHANGE_RATE,
-            "education_level": edu_map.get(education, 3), 
-            "employment_status": emp_map.get(employment, 3),
-            "job_title": job_map.get(job_title, 8),
-            "has_loan": is_loan_val,
-            "loan_type": loan_type_map.get(loan_type, 4),
-            "loan_term_months": loan_term_months,
-            "monthly_emi_inr": monthly_emi_usd * EXCHANGE_RATE,
-            "loan_interest_rate_pct": loan_interest_rate_pct,
-            "credit_score": credit_score
+    # 4. Insights (model calls are bounded by the shared client's concurrency limit)
+    async def analyse(p):
+        profile_payload = {
+            "user_id": p.user_id,
+            "monthly_income": p.monthly_income,
+            "monthly_emi": p.monthly_emi_usd,
+            "interest_rate": p.loan_interest_rate_pct,
+            "job_title": p.job_title,
+            "education_level": p.education
         }
+        transactions = grouped[p.user_id]
+        if not transactions:
+            return {"suggestions": [], "alerts": []}
+        if ai_insights:
+            return await generate_spending_insights_async(
+                profile_payload, transactions, summary=summaries[p.user_id], exclusions=exclusions[p.user_id]
+            )
+        return generate_template_insights(
+            profile_payload, transactions, summary=summaries[p.user_id], exclusions=exclusions[p.user_id]
+        )
 
-        feature_order = [
-            "monthly_income_inr", "education_level", "employment_status", 
-            "job_title", "has_loan", "loan_type", "loan_term_months", 
-            "monthly_emi_inr", "loan_interest_rate_pct", "credit_score"
-        ]
-        input_df = pd.DataFrame([input_row])[feature_order]
-
-        if model:
-            prediction_array = model.predict(input_df)
-            predicted_amt = float(prediction_array[0])
-        else:
-            predicted_amt = monthly_income * 0.7
+    analyses = await asyncio.gather(*(analyse(p) for p in scored))
 
-        # 5. Upsert Results to Supabase
-        result_entry = {
-            "user_id": user_id,
-            "monthly_income_usd": monthly_income,
-            "actual_monthly_expense": round(actual_monthly_expense, 2),
+    calculated_at = datetime.now().isoformat()
+    results, result_entries = [], []
+    for p, predicted_amt, analysis in zip(scored, predictions, analyses):
+        actual = summary_monthly_expense(summaries[p.user_id])
+        results.append({
+            "user_id": p.user_id,
+            "prediction": round(predicted_amt, 2),
+            "actual": round(actual, 2),
+            "alerts": len(analysis.get("alerts", []))
+        })
+        result_entries.append({
+            "user_id": p.user_id,
+            "monthly_income_usd": p.monthly_income,
+            "actual_monthly_expense": round(actual, 2),
             "predicted_next_month_expense": round(predicted_amt, 2),
-            "job_title": job_title,
-            "education_level": education,
-            "loan_interest_rate_pct": loan_interest_rate_pct,
+            "job_title": p.job_title,
+            "education_level": p.education,
+            "loan_interest_rate_pct": p.loan_interest_rate_pct,
             "suggestion": " | ".join(analysis.get("suggestions", [])),
-            "calculation_date": datetime.now().isoformat()
-        }
-        
-        supabase.table("spending_results").upsert(result_entry, on_conflict="user_id").execute()
+            "calculation_date": calculated_at
+        })
+    return results, result_entries, skipped
+
+@router.post("/predict/batch")
+async def predict_spending_batch(request: BatchPredictRequest):
+    """
+    Scores many users in one call (e.g. the nightly forecast run) and upserts
+    their spending_results rows in batches.
+    """
+    try:
+        results, skipped = [], []
+        failed = 0
+        for start in range(0, len(request.profiles), BATCH_CHUNK_USERS):
+            chunk = request.profiles[start:start + BATCH_CHUNK_USERS]
+            chunk_results, result_entries, chunk_skipped = await score_profile_chunk(chunk, request.ai_insights)
+            results.extend(chunk_results)
+            skipped.extend(chunk_skipped)
+
+            if result_entries:
+                write = await get_repository().upsert_spending_results(result_entries)
+                failed += write.failed
 
         return {
-            "status": "success",
-            "prediction": round(predicted_amt, 2),
-            "actual": round(actual_monthly_expense, 2),
-            "suggestions": analysis.get("suggestions", []),
-            "alerts": analysis.get("alerts", [])
+            "status": "success" if not failed else "partial",
+            "count": len(results),
+            "failed": failed,
+            "skipped": skipped,
+            "results": results
         }
 
     except Exception as e:
-        print(f"Prediction Error: {e}")
+        print(f"Batch Prediction Error: {e}")
         return {"status": "error", "message": str(e)}
 
+@router.get("/exclusions/{user_id}")
+async def get_exclusions(user_id: str):
+    """ Payees (self-transfers, family, cash) left out of the user's insights and savings. """
+    try:
+        names = await get_repository().load_exclusions(user_id)
+        return {"status": "success", "user_id": user_id, "names": list(names)}
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+
+@router.post("/exclusions")
+async def set_exclusions(user_id: str = Form(...), names: str = Form("")):
+    """ Replaces the user's exclusion list (comma-separated) and rebuilds their summary with it. """
+    try:
+        repo = get_repository()
+        saved = await repo.save_exclusions(user_id, names.split(","))
+        # Baselines, alerts and excluded totals were built with the old list
+        await repo.rebuild_summary(user_id)
+        return {"status": "success", "user_id": user_id, "names": list(saved)}
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+
+app.include_router(router)
+app.include_router(jobs_router)
+
 @app.get("/")
 def health_check():
-    return {"status": "Spending ML Service Online", "model_loaded": model is not None}
+    return {"status": "Spending ML Service Online", "model_loaded": get_model() is not None, "model_version": model_version()}
 
 if __name__ == "__main__":
+    import uvicorn
     port = int(os.environ.get("PORT", 8000))
     uvicorn.run(app, host="0.0.0.0", port=port)
@@ -0,0 +1,204 @@
+import itertools
+import re
+from dataclasses import dataclass
+from datetime import date
+from functools import lru_cache
+
+# Shared tables, built once at import time
+MONTHS = r'(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)'
+MONTH_NUMBERS = {
+    "jan": 1, "feb": 2, "mar": 3, "apr": 4, "may": 5, "jun": 6,
+    "jul": 7, "aug": 8, "sep": 9, "oct": 10, "nov": 11, "dec": 12
+}
+
+CATEGORY_MAP = {
+    "Medical": "Healthcare",
+    "Transfers": "Money Transfer",
+    "Money Transfer": "Money Transfer",
+    "Money Received": "Money Received"
+}
+
+# A hashtag category stays on its line and never swallows a following 'Rs' amount
+TAG_PATTERN = re.compile(r'#\s*([A-Za-z]+(?:[ \t]+(?!Rs\b)[A-Za-z]+)*)')
+AMOUNT_NOISE_PATTERN = re.compile(r'Rs\.?|INR|₹|[,\s+]')
+
+# Dates that carry a year, e.g. a statement period header '01 Dec 2024 - 31 Jan 2025'
+DATED_PATTERN = re.compile(
+    rf'(?:(?P<day>\d{{1,2}})\s+(?P<month>{MONTHS})|(?P<month2>{MONTHS})\s+(?P<day2>\d{{1,2}}),?)\s+(?P<year>\d{{4}})'
+)
+
+# How much of the first page is searched for the statement period
+HEADER_CHARS = 1000
+
+def clean_amount(amount_str: str) -> float:
+    """ Converts amount string like 'Rs. 1,234.56' or '+Rs. 500' to float. """
+    cleaned = AMOUNT_NOISE_PATTERN.sub('', amount_str)
+    try:
+        return float(cleaned)
+    except ValueError:
+        return 0.0
+
+@lru_cache(maxsize=1024)
+def normalise_category(tag: str) -> str:
+    """ Title-cases a raw hashtag and maps it through CATEGORY_MAP. """
+    category = ' '.join(word.capitalize() for word in tag.split())
+    return CATEGORY_MAP.get(category, category) or "Miscellaneous"
+
+def extract_category_dynamic(block_text: str) -> str:
+    """ Dynamically extracts category by looking for the hashtag symbol. """
+    tag_match = TAG_PATTERN.search(block_text)
+    if tag_match:
+        return normalise_category(tag_match.group(1))
+    return "Miscellaneous"
+
+@dataclass(frozen=True)
+class BankLayout:
+    """ Describes how one bank's statement text lays out a transaction block. """
+    name: str
+    name_prefixes: tuple = ("Paid to", "Received from", "Money sent to", "Payment to", "Automatic payment for")
+    month_first: bool = False
+
+LAYOUTS = {
+    # '05 Jan  Paid to ...  #Food  Rs. 450'
+    "day_first": BankLayout("day_first"),
+    # 'Jan 05, 2025  Paid to ...  #Food  ₹450'
+    "month_first": BankLayout("month_first", month_first=True),
+}
+DEFAULT_LAYOUT = LAYOUTS["day_first"]
+
+DAY_FIRST_START = re.compile(rf'^\d{{1,2}}\s+{MONTHS}', re.MULTILINE)
+MONTH_FIRST_START = re.compile(rf'^{MONTHS}\s+\d{{1,2}}', re.MULTILINE)
+
+def detect_layout(text: str) -> BankLayout:
+    """ Picks the layout whose date anchor starts the most lines of `text`. """
+    day_first = len(DAY_FIRST_START.findall(text))
+    month_first = len(MONTH_FIRST_START.findall(text))
+    return LAYOUTS["month_first"] if month_first > day_first else DEFAULT_LAYOUT
+
+class StatementCalendar:
+    """
+    Resolves the year of 'DD Mon' dates. The statement period end is taken from
+    the latest year-bearing date in the header, falling back to today; months
+    after the period end month belong to the previous year.
+    """
+
+    def __init__(self, period_end: date = None):
+        self.period_end = period_end
+
+    def observe(self, text: str):
+        if self.period_end is not None:
+            return
+        seen = []
+        for match in DATED_PATTERN.finditer(text):
+            day = match.group("day") or match.group("day2")
+            month = match.group("month") or match.group("month2")
+            try:
+                seen.append(date(int(match.group("year")), MONTH_NUMBERS[month.lower()], int(day)))
+            except ValueError:
+                continue
+        if seen:
+            self.period_end = max(seen)
+
+    def resolve(self, day: int, month: int, year: int = None):
+        if year is None:
+            end = self.period_end or date.today()
+            year = end.year - 1 if month > end.month else end.year
+        try:
+            return date(year, month, day)
+        except ValueError:
+            return None
+
+class TransactionTokenizer:
+    """ Extracts counterparty, amount and hashtag from a block in a single regex scan. """
+
+    def __init__(self, layout: BankLayout = DEFAULT_LAYOUT):
+        self.layout = layout
+        prefixes = '|'.join(re.escape(p) for p in layout.name_prefixes)
+        if layout.month_first:
+            date_token = rf'(?P<month>{MONTHS})\s+(?P<day>\d{{1,2}})(?:,?\s+(?P<year>\d{{4}}))?'
+        else:
+            date_token = rf'(?P<day>\d{{1,2}})\s+(?P<month>{MONTHS})(?:,?\s+(?P<year>\d{{4}}))?'
+
+        self.block_start = re.compile(rf'^(\d{{1,2}}\s+{MONTHS}|{MONTHS}\s+\d{{1,2}})')
+        self.date_pattern = re.compile(date_token)
+        # The leading character class lets the scan skip positions that cannot start a token
+        initials = ''.join(sorted({c for p in layout.name_prefixes for c in (p[0].upper(), p[0].lower())}))
+        self.pattern = re.compile(
+            rf'(?=[{re.escape(initials)}#+\-R₹I])(?:'
+            rf'(?is:(?:{prefixes})\s+(?P<name>.*?)(?=\s{{2,}}|Tag:|UPI ID:|#|\n|$))'
+            rf'|#\s*(?P<tag>[A-Za-z]+(?:[ \t]+(?!Rs\b)[A-Za-z]+)*)'
+            rf'|(?P<amount>(?:[+-]\s*)?(?:Rs\.?|₹|INR)\s*[\d,]+\.?\d*))'
+        )
+
+    def iter_blocks(self, page_texts):
+        """ Splits page texts into blocks starting with a Date, carrying open blocks across page breaks. """
+        current_block = []
+        for text in page_texts:
+            for line in text.split('\n'):
+                if self.block_start.match(line):
+                    if current_block:
+                        yield '\n'.join(current_block)
+                    current_block = [line]
+                else:
+                    current_block.append(line)
+
+        if current_block:
+            yield '\n'.join(current_block)
+
+    def tokenize(self, block: str, calendar: StatementCalendar):
+        """ Returns (date, description, amount, category) for a block, or None if it is incomplete. """
+        # Blocks start at their date, so this is an anchored hit rather than a scan
+        date_match = self.date_pattern.search(block)
+        if not date_match:
+            return None
+        day, month, year = date_match.group("day", "month", "year")
+        tx_date = calendar.resolve(int(day), MONTH_NUMBERS[month.lower()], int(year) if year else None)
+
+        description = amount = category = None
+        for match in self.pattern.finditer(block):
+            kind = match.lastgroup
+            if kind == "name":
+                if description is None:
+                    description = match.group("name").strip()
+            elif kind == "tag":
+                if category is None:
+                    category = normalise_category(match.group("tag"))
+            elif amount is None:
+                amount = clean_amount(match.group("amount"))
+
+            if description is not None and amount is not None and category is not None:
+                break
+
+        if not tx_date or description is None or amount is None:
+            return None
+        return tx_date.isoformat(), description, amount, category or "Miscellaneous"
+
+@lru_cache(maxsize=None)
+def get_tokenizer(layout: BankLayout = DEFAULT_LAYOUT) -> TransactionTokenizer:
+    return TransactionTokenizer(layout)
+
+def tokenize_statement(page_texts, user_id: str, layout: BankLayout = None, calendar: StatementCalendar = None):
+    """
+    Lazily turns page texts into transaction rows. The layout is detected from
+    the first page unless given, and so is the statement period.
+    """
+    calendar = calendar or StatementCalendar()
+    pages = iter(page_texts)
+    first_page = next(pages, None)
+    if first_page is None:
+        return
+    tokenizer = get_tokenizer(layout or detect_layout(first_page))
+    # The statement period is printed in the first page header
+    calendar.observe(first_page[:HEADER_CHARS])
+
+    for block in tokenizer.iter_blocks(itertools.chain((first_page,), pages)):
+        token = tokenizer.tokenize(block, calendar)
+        if token:
+            tx_date, description, amount, category = token
+            yield {
+                "user_id": user_id,
+                "date": tx_date,
+                "description": description,
+                "amount": amount,
+                "category": category
+            }
@@ -1,71 +1,278 @@
+"""
+Trains the spending model and writes a versioned bundle (see model_bundle.py)
+that spending.py loads as is: the compact forest, the category encodings,
+the feature order and the evaluation metrics.
+
+  * The CSV is read TRAIN_CHUNK_ROWS rows at a time, only the columns the
+    model uses, with category dtypes for the text columns. Each chunk is
+    encoded into a float32 block right away (the precision the trees split
+    on), so peak memory is the feature matrix plus one chunk. Rows are
+    assigned to the test split as they are read, so there is no second copy.
+  * Category codes follow LabelEncoder's convention (labels in sorted order).
+    They are written to the manifest, not printed for hand-copying, together
+    with LABEL_ALIASES for the form labels the dataset spells differently.
+  * The forest is fitted on all cores (--jobs). --max-samples and
+    --min-samples-leaf keep the trees bounded on large datasets.
+  * With --search-seconds, a random search over SEARCH_SPACE is scored on a
+    validation split of up to --search-rows training rows. No new trial starts
+    once the budget would be exceeded, and the best candidate is then refitted on
+    the full training split.
+
+Usage (from Backend/):
+    python train_model.py [--data synthetic_personal_finance_dataset.csv] [--out artifacts/spending]
+                          [--trees 100] [--jobs -1] [--search-seconds 300] [--pickle]
+"""
+import os
+import time
+import random
+import hashlib
+import argparse
+from datetime import datetime
+import numpy as np
 import pandas as pd
+import sklearn
 from sklearn.ensemble import RandomForestRegressor
-from sklearn.model_selection import train_test_split
-from sklearn.preprocessing import LabelEncoder
-import joblib
+from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+from forest import CompactForest
+from model_bundle import save_bundle
 
-# 1. Load Data
-df = pd.read_csv('synthetic_personal_finance_dataset.csv')
+# 1. Settings
+# Converting USD to INR to match your local transaction data (the service's form is already in INR)
 EXCHANGE_RATE = 91.60
+TRAIN_CHUNK_ROWS = int(os.getenv("TRAIN_CHUNK_ROWS", 100000))
+TRAIN_JOBS = int(os.getenv("TRAIN_JOBS", -1))
+RANDOM_STATE = 42
 
-# 2. Feature Engineering & Currency Conversion
-# Converting USD to INR to match your local transaction data
-df['monthly_income_inr'] = df['monthly_income_usd'] * EXCHANGE_RATE
-df['monthly_expenses_inr'] = df['monthly_expenses_usd'] * EXCHANGE_RATE
-# Fill missing EMI values with 0 for users without loans before conversion
-df['monthly_emi_inr'] = df['monthly_emi_usd'].fillna(0) * EXCHANGE_RATE
-
-# 3. Encoding Categorical Values
-# We use LabelEncoder to turn text into numerical values
-le = LabelEncoder()
-
-# List of columns to encode
-categorical_cols = ['education_level', 'employment_status', 'job_title', 'loan_type']
-
-# Dictionary to store mappings for the FastAPI backend
-mappings = {}
-
-for col in categorical_cols:
-    # Fill NaN for loan_type specifically
-    if col == 'loan_type':
-        df[col] = df[col].fillna('None')
-    
-    df[col] = le.fit_transform(df[col])
-    # Store the classes to generate the mapping dictionary for the backend
-    mappings[col] = {label: index for index, label in enumerate(le.classes_)}
-
-# Encode the binary 'has_loan' column
-df['has_loan'] = df['has_loan'].apply(lambda x: 1 if x == "Yes" else 0)
-
-# 4. Prepare Feature Matrix (X) and Target (y)
-# The order of these 10 features MUST be preserved in FastAPI
-features = [
-    'monthly_income_inr', 
-    'education_level', 
-    'employment_status', 
-    'job_title',
-    'has_loan', 
-    'loan_type', 
-    'loan_term_months', 
-    'monthly_emi_inr', 
-    'loan_interest_rate_pct', 
-    'credit_score'
+# The model's input order; recorded in the manifest, which spending.py builds rows from
+FEATURE_ORDER = [
+    "monthly_income_inr", "education_level", "employment_status",
+    "job_title", "has_loan", "loan_type", "loan_term_months",
+    "monthly_emi_inr", "loan_interest_rate_pct", "credit_score"
 ]
+CATEGORICAL_COLUMNS = ["education_level", "employment_status", "job_title", "loan_type"]
+# Stands in for missing values here, and for unseen labels in the service
+FALLBACK_LABELS = {"education_level": "Other", "employment_status": "Unemployed", "job_title": "Unemployed", "loan_type": "None"}
+# Form label -> dataset label, for labels the form spells differently; the service
+# tries them when a label has no code of its own
+LABEL_ALIASES = {
+    "education_level": {"Bachelor's": "Bachelor", "Master's": "Master"},
+    "job_title": {"AI/ML Engineer": "Engineer"},
+    "loan_type": {"Personal": "Business"}
+}
+TARGET = "monthly_expenses_inr"
+
+# Only these columns are read. Amounts stay float64 until they are converted
+# to INR, so the float32 features match what scikit-learn would cast them to
+COLUMN_DTYPES = {
+    "education_level": "category", "employment_status": "category", "job_title": "category",
+    "loan_type": "category", "has_loan": "category",
+    "monthly_income_usd": "float64", "monthly_expenses_usd": "float64", "monthly_emi_usd": "float64",
+    "loan_term_months": "float32", "loan_interest_rate_pct": "float32", "credit_score": "float32"
+}
+
+# Candidates for --search-seconds (None = scikit-learn's default)
+SEARCH_SPACE = {
+    "n_estimators": [100, 200, 300],
+    "max_depth": [None, 12, 16, 24],
+    "min_samples_leaf": [1, 2, 4, 8],
+    "max_features": [1.0, 0.7, 0.5, "sqrt"],
+    "max_samples": [None, 0.5, 0.8]
+}
+
+# 2. Chunked, typed loading
+def encode_column(column, vocabulary: dict, fallback: str) -> np.ndarray:
+    """ Codes of one chunk's categorical column in `vocabulary` (label -> id, first-seen order). """
+    lookup = [vocabulary.setdefault(label, len(vocabulary)) for label in column.cat.categories]
+    codes = column.cat.codes.to_numpy()
+    if (codes < 0).any():
+        # Missing values are code -1, which picks the fallback appended last
+        lookup.append(vocabulary.setdefault(fallback, len(vocabulary)))
+    return np.asarray(lookup, dtype=np.float32)[codes]
+
+def encode_chunk(chunk, vocabularies: dict) -> tuple:
+    """ (float32 features in FEATURE_ORDER, float64 target) for one chunk. """
+    columns = {
+        "monthly_income_inr": chunk["monthly_income_usd"].to_numpy() * EXCHANGE_RATE,
+        # Missing EMI values are users without loans
+        "monthly_emi_inr": chunk["monthly_emi_usd"].fillna(0).to_numpy() * EXCHANGE_RATE,
+        "has_loan": (chunk["has_loan"] == "Yes").to_numpy(),
+        "loan_term_months": chunk["loan_term_months"].to_numpy(),
+        "loan_interest_rate_pct": chunk["loan_interest_rate_pct"].to_numpy(),
+        "credit_score": chunk["credit_score"].to_numpy()
+    }
+    for col in CATEGORICAL_COLUMNS:
+        columns[col] = encode_column(chunk[col], vocabularies[col], FALLBACK_LABELS[col])
+
+    block = np.empty((len(chunk), len(FEATURE_ORDER)), dtype=np.float32)
+    for position, name in enumerate(FEATURE_ORDER):
+        block[:, position] = columns[name]
+    return block, chunk["monthly_expenses_usd"].to_numpy() * EXCHANGE_RATE
+
+def load_dataset(path: str, chunk_rows: int = TRAIN_CHUNK_ROWS, test_fraction: float = 0.2) -> dict:
+    """
+    Reads and encodes the dataset chunk by chunk, splitting off the test rows
+    as it goes. Returns the train/test arrays and the sorted-label encodings.
+    """
+    rng = np.random.default_rng(RANDOM_STATE)
+    vocabularies = {col: {} for col in CATEGORICAL_COLUMNS}
+    parts = {"X_train": [], "y_train": [], "X_test": [], "y_test": []}
+
+    for chunk in pd.read_csv(path, usecols=list(COLUMN_DTYPES), dtype=COLUMN_DTYPES, chunksize=chunk_rows):
+        X, y = encode_chunk(chunk, vocabularies)
+        test = rng.random(len(X)) < test_fraction
+        parts["X_train"].append(X[~test])
+        parts["y_train"].append(y[~test])
+        parts["X_test"].append(X[test])
+        parts["y_test"].append(y[test])
+
+    data = {name: np.concatenate(blocks) for name, blocks in parts.items()}
+    parts.clear()
+
+    # Renumber first-seen ids to LabelEncoder's sorted order, column by column in place
+    encodings = {}
+    for col, vocabulary in vocabularies.items():
+        encodings[col] = {label: code for code, label in enumerate(sorted(vocabulary))}
+        remap = np.empty(len(vocabulary), dtype=np.float32)
+        for label, first_seen in vocabulary.items():
+            remap[first_seen] = encodings[col][label]
+        position = FEATURE_ORDER.index(col)
+        for name in ("X_train", "X_test"):
+            data[name][:, position] = remap[data[name][:, position].astype(np.intp)]
+    data["encodings"] = encodings
+    return data
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+# 3. Fitting and search
+def fit_forest(X, y, params: dict, jobs: int = TRAIN_JOBS) -> RandomForestRegressor:
+    """ Fits on all `jobs` cores; a named frame lets the pickled model predict on named rows. """
+    model = RandomForestRegressor(random_state=RANDOM_STATE, n_jobs=jobs, **params)
+    model.fit(pd.DataFrame(X, columns=FEATURE_ORDER, copy=False), y)
+    return model
+
+def evaluate(model, X, y) -> dict:
+    predicted = model.predict(pd.DataFrame(X, columns=FEATURE_ORDER, copy=False))
+    return {
+        "mae": round(float(mean_absolute_error(y, predicted)), 4),
+        "rmse": round(float(np.sqrt(mean_squared_error(y, predicted))), 4),
+        "r2": round(float(r2_score(y, predicted)), 6)
+    }
+
+def search(X, y, base_params: dict, budget_seconds: float, max_rows: int, jobs: int = TRAIN_JOBS) -> tuple:
+    """ Random search scored by validation MAE; returns (best params, trials) once the budget is spent. """
+    rng = np.random.default_rng(RANDOM_STATE)
+    rows = rng.permutation(len(X))[:max_rows]
+    validation = int(len(rows) * 0.2)
+    X_fit, y_fit = X[rows[validation:]], y[rows[validation:]]
+    X_val, y_val = X[rows[:validation]], y[rows[:validation]]
+
+    sampler = random.Random(RANDOM_STATE)
+    space_size = int(np.prod([len(values) for values in SEARCH_SPACE.values()]))
+    deadline = time.monotonic() + budget_seconds
+    candidate, seen, trials = dict(base_params), set(), []
+    best = None
+    while True:
+        seen.add(tuple(sorted(candidate.items(), key=lambda item: item[0])))
+        started = time.monotonic()
+        model = fit_forest(X_fit, y_fit, candidate, jobs)
+        score = evaluate(model, X_val, y_val)
+        elapsed = time.monotonic() - started
+        trials.append({"params": candidate, "validation": score, "seconds": round(elapsed, 2)})
+        print(f"  trial {len(trials)}: {candidate} -> MAE {score['mae']:.2f} ({elapsed:.1f}s)")
+        if best is None or score["mae"] < best[1]:
+            best = (candidate, score["mae"])
+        del model
+
+        # Stop when a trial like the last one would overrun, or every candidate has been tried
+        if time.monotonic() + elapsed > deadline or len(seen) >= space_size:
+            break
+        while tuple(sorted(candidate.items(), key=lambda item: item[0])) in seen:
+            candidate = {name: sampler.choice(values) for name, values in SEARCH_SPACE.items()}
+    return best[0], trials
+
+def max_features_arg(value: str):
+    return value if value in ("sqrt", "log2") else float(value)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data", default="synthetic_personal_finance_dataset.csv")
+    parser.add_argument("--out", default="artifacts/spending", help="bundle root; each run adds a version")
+    parser.add_argument("--trees", type=int, default=100)
+    parser.add_argument("--max-depth", type=int, default=None)
+    parser.add_argument("--min-samples-leaf", type=int, default=1)
+    parser.add_argument("--max-features", type=max_features_arg, default=1.0)
+    parser.add_argument("--max-samples", type=float, default=None, help="bootstrap fraction per tree")
+    parser.add_argument("--jobs", type=int, default=TRAIN_JOBS, help="cores to fit on (-1 = all)")
+    parser.add_argument("--chunk-rows", type=int, default=TRAIN_CHUNK_ROWS)
+    parser.add_argument("--test-fraction", type=float, default=0.2)
+    parser.add_argument("--search-seconds", type=float, default=0, help="time budget for a hyperparameter search")
+    parser.add_argument("--search-rows", type=int, default=200000, help="training rows the search works on")
+    parser.add_argument("--pickle", action="store_true", help="also store the scikit-learn model in the bundle")
+    args = parser.parse_args()
+
+    # 4. Load Data
+    started = time.monotonic()
+    data = load_dataset(args.data, args.chunk_rows, args.test_fraction)
+    X_train, y_train, X_test, y_test = data["X_train"], data["y_train"], data["X_test"], data["y_test"]
+    print(f"Loaded {len(X_train) + len(X_test)} rows ({X_train.nbytes / 1e6:.1f} MB of training features) "
+          f"in {time.monotonic() - started:.1f}s")
+
+    # 5. Train Model (optionally searching for its parameters first)
+    params = {
+        "n_estimators": args.trees, "max_depth": args.max_depth, "min_samples_leaf": args.min_samples_leaf,
+        "max_features": args.max_features, "max_samples": args.max_samples
+    }
+    trials = []
+    if args.search_seconds > 0:
+        print(f"Searching for {args.search_seconds:.0f}s on up to {args.search_rows} rows")
+        params, trials = search(X_train, y_train, params, args.search_seconds, args.search_rows, args.jobs)
+        print(f"Best parameters: {params}")
+
+    started = time.monotonic()
+    model = fit_forest(X_train, y_train, params, args.jobs)
+    fit_seconds = time.monotonic() - started
+    metrics = {"test": evaluate(model, X_test, y_test), "fit_seconds": round(fit_seconds, 2)}
 
-X = df[features]
-y = df['monthly_expenses_inr']
+    # 6. Flatten the forest into contiguous node arrays for the service's request path
+    forest = CompactForest.from_sklearn(model, feature_names=FEATURE_ORDER)
+    metrics["max_abs_diff_compact"] = float(abs(forest.predict(X_test) - model.predict(
+        pd.DataFrame(X_test, columns=FEATURE_ORDER, copy=False))).max())
+    metrics.update(n_trees=forest.n_trees, n_nodes=forest.n_nodes, forest_mb=round(forest.nbytes / 1e6, 2))
 
-# 5. Train Model
-# RandomForest handles complex interactions between Job Title and Credit Score
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-model = RandomForestRegressor(n_estimators=100, random_state=42)
-model.fit(X_train, y_train)
+    # 7. Save the bundle
+    manifest = {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "feature_order": FEATURE_ORDER,
+        "encodings": data["encodings"],
+        "fallback_labels": FALLBACK_LABELS,
+        # Only aliases whose dataset label was seen, so every entry has a code
+        "label_aliases": {
+            col: {label: alias for label, alias in aliases.items() if alias in data["encodings"][col]}
+            for col, aliases in LABEL_ALIASES.items()
+        },
+        "target": TARGET,
+        "params": params,
+        "metrics": metrics,
+        "search": trials,
+        "dataset": {
+            "path": os.path.basename(args.data), "sha256": file_sha256(args.data),
+            "train_rows": len(X_train), "test_rows": len(X_test)
+        },
+        "libraries": {"scikit-learn": sklearn.__version__, "numpy": np.__version__, "pandas": pd.__version__}
+    }
+    path = save_bundle(args.out, forest, manifest, model=model if args.pickle else None)
 
-# 6. Save Model
-joblib.dump(model, 'spending_model.pkl')
+    test = metrics["test"]
+    print(f"Fitted {forest.n_trees} trees in {fit_seconds:.1f}s: test MAE {test['mae']:.2f}, "
+          f"RMSE {test['rmse']:.2f}, R² {test['r2']:.4f}")
+    print(f"Compact forest: {forest.n_nodes} nodes, {forest.nbytes / 1e6:.1f} MB, "
+          f"max |diff| vs sklearn = {metrics['max_abs_diff_compact']:.2e}")
+    print(f"Bundle written to {path}")
 
-# 7. Output Mappings for Backend
-print("Model trained with 10 features and saved successfully.\n")
-print("--- COPY THESE MAPPINGS TO YOUR FASTAPI spending.py ---")
-for col, mapping in mappings.items():
-    print(f"{col}_map = {mapping}")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
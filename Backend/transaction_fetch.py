@@ -0,0 +1,72 @@
+import os
+
+# Only the columns the analytics read; 'id' is the keyset tie-breaker
+ANALYTICS_COLUMNS = "id, date, amount, description, category, merchant_id"
+FETCH_PAGE_SIZE = int(os.getenv("FETCH_PAGE_SIZE", 1000))
+
+def iter_user_transactions(client, user_id: str, start: str = None, end: str = None,
+                           columns: str = ANALYTICS_COLUMNS, page_size: int = None):
+    """
+    Streams a user's transactions ordered by (date, id), optionally limited to
+    the [start, end] date window. Pages use keyset pagination, so every page
+    is an index range scan and the server row cap is never hit.
+    """
+    page_size = max(page_size or FETCH_PAGE_SIZE, 1)
+    if "id" not in [c.strip() for c in columns.split(",")]:
+        columns = f"id, {columns}"
+
+    last_date = last_id = None
+    while True:
+        query = client.table("transactions").select(columns).eq("user_id", user_id)
+        if start:
+            query = query.gte("date", start)
+        if end:
+            query = query.lte("date", end)
+        if last_id is not None:
+            query = query.or_(f"date.gt.{last_date},and(date.eq.{last_date},id.gt.{last_id})")
+
+        rows = query.order("date").order("id").limit(page_size).execute().data or []
+        yield from rows
+
+        if len(rows) < page_size:
+            return
+        last_date, last_id = rows[-1]["date"], rows[-1]["id"]
+
+def fetch_user_transactions(client, user_id: str, start: str = None, end: str = None,
+                            columns: str = ANALYTICS_COLUMNS, page_size: int = None) -> list:
+    return list(iter_user_transactions(client, user_id, start, end, columns, page_size))
+
+def iter_users_transactions(client, user_ids: list, start: str = None, end: str = None,
+                            columns: str = ANALYTICS_COLUMNS, page_size: int = None):
+    """
+    Streams the transactions of many users in one id-ordered keyset scan,
+    for batch jobs that would otherwise issue one query per user.
+    """
+    page_size = max(page_size or FETCH_PAGE_SIZE, 1)
+    wanted = [c.strip() for c in columns.split(",")]
+    columns = ", ".join(["id", "user_id"] + [c for c in wanted if c not in ("id", "user_id")])
+
+    last_id = None
+    while True:
+        query = client.table("transactions").select(columns).in_("user_id", list(user_ids))
+        if start:
+            query = query.gte("date", start)
+        if end:
+            query = query.lte("date", end)
+        if last_id is not None:
+            query = query.gt("id", last_id)
+
+        rows = query.order("id").limit(page_size).execute().data or []
+        yield from rows
+
+        if len(rows) < page_size:
+            return
+        last_id = rows[-1]["id"]
+
+def fetch_existing_transactions(client, user_id: str, transactions: list) -> list:
+    """ Loads the user's stored rows in the date range covered by `transactions`. """
+    dates = [tx["date"] for tx in transactions]
+    # Paged, so a large export is checked against every stored row and not just the first page
+    return list(iter_user_transactions(
+        client, user_id, min(dates), max(dates), columns="id, user_id, date, description, amount"
+    ))
@@ -0,0 +1,246 @@
+"""
+Per-user spending summaries maintained at ingest time.
+
+Each row of the `spending_summaries` table holds running totals for one user
+(counts, total expense and income, first/last date, per-category and
+per-month expense), so /predict reads a single row instead of scanning the
+user's whole history. It also carries the per-category anomaly baselines and
+the most recent alerts (see anomaly.py).
+
+Backfill existing users (from Backend/):
+    python user_summary.py --all
+    python user_summary.py --user <user_id> [--user <user_id> ...]
+"""
+import os
+import copy
+import argparse
+from datetime import date, datetime, timezone
+
+from transaction_fetch import iter_user_transactions
+from anomaly import ANOMALY_KEEP, AnomalyDetector
+from exclusions import user_matcher
+
+SUMMARY_TABLE = "spending_summaries"
+DAYS_PER_MONTH = 30.44
+# Concurrent ingests for one user each retry their summary write up to this many times
+SUMMARY_WRITE_ATTEMPTS = int(os.getenv("SUMMARY_WRITE_ATTEMPTS", 5))
+
+# A user's watermark (see summary_watermark) is read from their summary row on every
+# lookup, so writes by any worker are seen at once; it is a primary-key select of three columns
+WATERMARK_COLUMNS = "tx_count, max_date, updated_at"
+
+def empty_summary(user_id: str) -> dict:
+    return {
+        "user_id": user_id,
+        "tx_count": 0,
+        "expense_count": 0,
+        "total_expense": 0.0,
+        "total_income": 0.0,
+        "excluded_expense": 0.0,
+        "min_date": None,
+        "max_date": None,
+        "by_category": {},
+        "by_month": {},
+        "baselines": {},
+        "alerts": []
+    }
+
+def apply_transactions(summary: dict, transactions, alerts: list = None, exclusions=None) -> dict:
+    """
+    Folds transaction rows into the running totals of `summary` (in place).
+    Expenses that are anomalous for their category are added to the summary's
+    recent alerts and, when given, to `alerts`. Expenses matching `exclusions`
+    (an exclusions.ExclusionMatcher) are totalled apart and never scored.
+    """
+    by_category = summary["by_category"]
+    by_month = summary["by_month"]
+    detector = AnomalyDetector(summary.setdefault("baselines", {}))
+    recent = summary.setdefault("alerts", [])
+
+    for tx in transactions:
+        amount = float(tx["amount"])
+        tx_date = tx.get("date")
+        summary["tx_count"] += 1
+
+        if tx_date:
+            if summary["min_date"] is None or tx_date < summary["min_date"]:
+                summary["min_date"] = tx_date
+            if summary["max_date"] is None or tx_date > summary["max_date"]:
+                summary["max_date"] = tx_date
+
+        if amount < 0:
+            spent = abs(amount)
+            category = tx.get("category") or "Miscellaneous"
+            summary["expense_count"] += 1
+            summary["total_expense"] += spent
+            by_category[category] = by_category.get(category, 0.0) + spent
+            if tx_date:
+                month = tx_date[:7]
+                by_month[month] = by_month.get(month, 0.0) + spent
+
+            if exclusions and exclusions.matches(tx.get("description")):
+                summary["excluded_expense"] = summary.get("excluded_expense", 0.0) + spent
+                continue
+
+            alert = detector.observe(tx, category, spent)
+            if alert:
+                recent.append(alert)
+                if alerts is not None:
+                    alerts.append(alert)
+        else:
+            summary["total_income"] += amount
+
+    summary["alerts"] = recent[-ANOMALY_KEEP:]
+    summary["updated_at"] = utc_now()
+    return summary
+
+def utc_now() -> str:
+    """ updated_at values are written timezone-aware, as the timestamptz column reads them back. """
+    return datetime.now(timezone.utc).isoformat()
+
+def span_days(summary: dict) -> int:
+    """ Days between the first and last transaction, as /predict has always measured it. """
+    if summary["min_date"] is None or summary["min_date"] == summary["max_date"]:
+        return 1
+    return (date.fromisoformat(summary["max_date"]) - date.fromisoformat(summary["min_date"])).days
+
+def actual_monthly_expense(summary: dict) -> float:
+    return (summary["total_expense"] / max(span_days(summary), 1)) * DAYS_PER_MONTH
+
+def summary_months(summary: dict) -> float:
+    """ Length of the history in months, rounded the way insights.py normalises. """
+    if summary["min_date"] is None or summary["min_date"] == summary["max_date"]:
+        return 1
+    return max(1, round(span_days(summary) / DAYS_PER_MONTH, 1))
+
+def load_summary(client, user_id: str):
+    response = client.table(SUMMARY_TABLE).select("*").eq("user_id", user_id).execute()
+    return response.data[0] if response.data else None
+
+def load_summaries(client, user_ids: list) -> dict:
+    """ Summaries of many users in one round-trip, keyed by user_id. """
+    response = client.table(SUMMARY_TABLE).select("*").in_("user_id", list(user_ids)).execute()
+    return {row["user_id"]: row for row in response.data or []}
+
+def save_summary(client, summary: dict):
+    client.table(SUMMARY_TABLE).upsert(summary, on_conflict="user_id").execute()
+
+class SummaryConflict(Exception):
+    pass
+
+def save_summary_if_unchanged(client, summary: dict, stored: dict) -> bool:
+    """
+    Writes `summary` only if the user's row is still the `stored` one that it
+    was computed from (matched on updated_at; stored=None means no row yet).
+    Returns False when another writer got there first.
+    """
+    table = client.table(SUMMARY_TABLE)
+    if stored is None:
+        response = table.upsert(summary, on_conflict="user_id", ignore_duplicates=True).execute()
+    else:
+        query = table.update(summary).eq("user_id", summary["user_id"])
+        if stored.get("updated_at") is None:
+            query = query.is_("updated_at", "null")
+        else:
+            query = query.eq("updated_at", stored["updated_at"])
+        response = query.execute()
+    return bool(response.data)
+
+def summary_watermark(summary: dict) -> tuple:
+    """
+    (row count, latest date, last update) of a user's history. Any ingest or
+    rebuild changes it, so results computed at one watermark stay valid until it moves.
+    The update time is compared as an instant, so the local dict and the row as
+    read back ("+00:00", "Z", or a legacy naive UTC value) give the same watermark.
+    """
+    if summary is None:
+        return (0, None, None)
+    updated_at = summary.get("updated_at")
+    if updated_at is not None:
+        updated_at = datetime.fromisoformat(updated_at)
+        if updated_at.tzinfo is None:
+            updated_at = updated_at.replace(tzinfo=timezone.utc)
+    return (summary["tx_count"], summary["max_date"], updated_at)
+
+def touch_watermark(client, user_id: str):
+    """ Moves the stored watermark without a summary write (rows stored but the summary update failed). """
+    client.table(SUMMARY_TABLE).update({"updated_at": utc_now()}).eq("user_id", user_id).execute()
+
+def load_watermark(client, user_id: str) -> tuple:
+    """ The user's current watermark, from the three summary columns it needs. """
+    response = client.table(SUMMARY_TABLE).select(WATERMARK_COLUMNS).eq("user_id", user_id).execute()
+    return summary_watermark(response.data[0] if response.data else None)
+
+def record_ingested(client, user_id: str, transactions: list) -> tuple:
+    """
+    Adds freshly inserted rows to the user's stored summary; returns it with their alerts.
+    The write is conditional on the row it was computed from, and a concurrent
+    ingest for the same user makes it reload and fold the rows in again.
+    """
+    exclusions = user_matcher(client, user_id)
+    for _ in range(SUMMARY_WRITE_ATTEMPTS):
+        stored = load_summary(client, user_id)
+        if stored is not None and stored.get("baselines") is None:
+            # Stored before anomaly baselines existed: build them once from the full history
+            summary = rebuild_summary(client, user_id)
+            new_rows = {(tx.get("date"), tx.get("description") or "") for tx in transactions}
+            return summary, [a for a in summary["alerts"] if (a["date"], a["description"]) in new_rows]
+
+        alerts = []
+        base = copy.deepcopy(stored) if stored is not None else empty_summary(user_id)
+        summary = apply_transactions(base, transactions, alerts, exclusions)
+        if save_summary_if_unchanged(client, summary, stored):
+            return summary, alerts
+    raise SummaryConflict(f"summary for {user_id} kept changing after {SUMMARY_WRITE_ATTEMPTS} attempts")
+
+def rebuild_summary(client, user_id: str) -> dict:
+    """ Recomputes a user's summary from their full history (backfill / repair). """
+    summary = apply_transactions(
+        empty_summary(user_id), iter_user_transactions(client, user_id), exclusions=user_matcher(client, user_id)
+    )
+    save_summary(client, summary)
+    return summary
+
+def rebuild_all(client, page_size: int = 1000) -> int:
+    """ Rebuilds every user's summary in one keyset-paged pass over the transactions table. """
+    summaries = {}
+    matchers = {}
+    last_id = None
+    while True:
+        query = client.table("transactions").select("id, user_id, date, description, amount, category")
+        if last_id is not None:
+            query = query.gt("id", last_id)
+        rows = query.order("id").limit(page_size).execute().data or []
+        for tx in rows:
+            user_id = tx["user_id"]
+            if user_id not in summaries:
+                summaries[user_id] = empty_summary(user_id)
+                matchers[user_id] = user_matcher(client, user_id)
+            apply_transactions(summaries[user_id], (tx,), exclusions=matchers[user_id])
+        if len(rows) < page_size:
+            break
+        last_id = rows[-1]["id"]
+
+    for summary in summaries.values():
+        save_summary(client, summary)
+    return len(summaries)
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    from repository import client_from_env
+
+    parser = argparse.ArgumentParser(description="Rebuild per-user spending summaries.")
+    parser.add_argument("--user", action="append", default=[], help="user id to rebuild (repeatable)")
+    parser.add_argument("--all", action="store_true", help="rebuild every user with transactions")
+    args = parser.parse_args()
+
+    load_dotenv()
+    client = client_from_env()
+
+    if args.all:
+        print(f"Rebuilt {rebuild_all(client)} user summaries")
+    for user_id in args.user:
+        summary = rebuild_summary(client, user_id)
+        print(f"Rebuilt {user_id}: {summary['tx_count']} transactions")
+    if not args.all and not args.user:
+        parser.print_help()
@@ -47,13 +47,13 @@ const FileUpload = ({ user_id, onUploadSuccess }) => {
   return (
     <div className="max-w-3xl mx-auto bg-fintech-card border border-white/5 rounded-[2.5rem] p-12 text-center shadow-2xl">
       <h2 className="text-4xl font-bold mb-4 text-white">Ingestion Portal</h2>
-      <p className="text-gray-400 mb-12">Drop your bank statements (PDF/CSV) to begin the analysis</p>
+      <p className="text-gray-400 mb-12">Drop your bank statements (PDF/CSV/XLSX) to begin the analysis</p>
 
       {/* The Sky Blue themed dropzone */}
       <div className="relative border-2 border-dashed border-white/10 rounded-3xl p-16 group hover:border-fintech-accent/50 transition-colors cursor-pointer bg-white/[0.02]">
         <input 
           type="file" 
-          accept=".pdf,.csv"
+          accept=".pdf,.csv,.xlsx"
           className="absolute inset-0 opacity-0 cursor-pointer z-20" 
           onChange={(e) => {
               setFile(e.target.files[0]);
@@ -0,0 +1,9 @@
+-- Idempotent transaction inserts.
+-- Backend/dedupe.py fingerprints each row (user, date, description, amount and the
+-- occurrence number within its statement). The backend upserts on this column with
+-- ignore-duplicates, so a batch retried after a lost response is not stored twice.
+-- Rows inserted before this migration keep a NULL fingerprint, which never conflicts.
+
+alter table transactions add column if not exists fingerprint text;
+
+create unique index if not exists transactions_fingerprint_key on transactions (fingerprint);
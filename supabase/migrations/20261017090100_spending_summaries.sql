@@ -0,0 +1,20 @@
+-- Per-user running totals maintained at ingest time (Backend/user_summary.py).
+-- One row per user. Ingests write it conditionally on updated_at, so two
+-- concurrent uploads for one user retry instead of overwriting each other.
+-- Fill it for existing users with `python user_summary.py --all`.
+
+create table if not exists spending_summaries (
+    user_id text primary key,
+    tx_count integer not null default 0,
+    expense_count integer not null default 0,
+    total_expense double precision not null default 0,
+    total_income double precision not null default 0,
+    excluded_expense double precision not null default 0,
+    min_date date,
+    max_date date,
+    by_category jsonb not null default '{}'::jsonb,
+    by_month jsonb not null default '{}'::jsonb,
+    baselines jsonb,
+    alerts jsonb not null default '[]'::jsonb,
+    updated_at timestamptz
+);
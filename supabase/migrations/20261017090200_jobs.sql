@@ -0,0 +1,16 @@
+-- Snapshots of background jobs (Backend/jobs.py), written when JOB_PERSIST=1 so a
+-- poll or event stream served by another worker can follow a job it does not own.
+-- Rows are only read back by job_id; finished jobs can be pruned by updated_at.
+
+create table if not exists jobs (
+    job_id text primary key,
+    kind text not null,
+    status text not null,
+    result jsonb not null default '{}'::jsonb,
+    error text,
+    events jsonb not null default '[]'::jsonb,
+    created_at timestamptz not null,
+    updated_at timestamptz not null
+);
+
+create index if not exists jobs_updated_at_idx on jobs (updated_at);
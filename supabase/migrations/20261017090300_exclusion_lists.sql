@@ -0,0 +1,9 @@
+-- Per-user lists of payees left out of insights and anomaly scoring (Backend/exclusions.py).
+-- One row per user, upserted on user_id. Names are stored normalised (lower case,
+-- single-spaced, sorted). Users without a row get the built-in default list.
+
+create table if not exists exclusion_lists (
+    user_id text primary key,
+    names text[] not null default '{}',
+    updated_at timestamptz not null default now()
+);
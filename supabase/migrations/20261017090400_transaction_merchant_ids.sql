@@ -0,0 +1,7 @@
+-- Canonical merchant of each transaction (Backend/merchants.py), set at ingest time
+-- and read by the analytics queries. The id is a hash computed in Python, so rows
+-- stored before this migration are filled by the backend (from Backend/):
+--     python merchants.py --backfill
+-- Until then analytics resolves a NULL merchant_id from the description.
+
+alter table transactions add column if not exists merchant_id text;